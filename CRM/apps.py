@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CrmConfig(AppConfig):
     name = 'CRM'
+
+    def ready(self):
+        from CRM import audit, counters, fragments, reports, sync  # noqa: F401 connects signal receivers
+        from ProgrammingWorkshop import db  # noqa: F401 applies SQLite pragmas to new connections
@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from CRM.models import ArchivedRow, ChangeLog, Company, ContactPerson, Note
+from users.models import User
+
+# Children are archived before parents, archived rows of company take its notes and contact people with them
+ARCHIVED = (Note, ContactPerson, Company, User)
+CHILDREN = {Company: (Note, ContactPerson)}
+# Restored groups are inserted parents first
+RESTORE_ORDER = (Company, Note, ContactPerson, User)
+MODELS = {model._meta.label_lower: model for model in ARCHIVED}
+
+
+def referenced(model, field):
+    return Exists(model.objects.filter(**{field: OuterRef('pk')}))
+
+
+def archivable(model, cutoff):
+    """Soft deleted rows of model last changed before cutoff
+
+    Users still referenced by any row, change log entry or archived row are kept, archiving them would break or
+    null references.
+    """
+    rows = model.objects.filter(is_deleted=True, updated_at__lt=cutoff)
+    if model is User:
+        references = (referenced(Company, 'user'), referenced(Note, 'user'), referenced(ContactPerson, 'user'),
+                      referenced(ChangeLog, 'actor'), Exists(ArchivedRow.objects.filter(data__user_id=OuterRef('pk'))))
+        for reference in references:
+            rows = rows.exclude(reference)
+    return rows
+
+
+def archived_row(row, root_model, root_id):
+    return ArchivedRow(model=row._meta.label_lower, object_id=row.pk, root_model=root_model._meta.label_lower,
+                       root_id=root_id, data=row.field_values())
+
+
+def archive_batch(model, cutoff, batch_size):
+    """Move one batch of archivable rows with their children to archive in single transaction, return its size
+
+    Every batch commits on its own, interrupted archival resumes with rows which were not moved yet.
+    """
+    with transaction.atomic():
+        roots = list(archivable(model, cutoff).order_by('pk')[:batch_size])
+        if not roots:
+            return 0
+        pks = [root.pk for root in roots]
+        archived = [archived_row(root, model, root.pk) for root in roots]
+        children = CHILDREN.get(model, ())
+        for child in children:
+            archived += [archived_row(row, model, row.company_id) for row in child.objects.filter(company__in=pks)]
+        ArchivedRow.objects.bulk_create(archived)
+        for child in children:
+            child.objects.filter(company__in=pks).delete_rows()
+        model.objects.filter(pk__in=pks).delete_rows()
+    return len(roots)
+
+
+class RestoreConflict(Exception):
+    """Unique value of archived row, such as company nip or user login, was taken by live row meanwhile"""
+
+
+def check_unique(model, rows):
+    """Raise RestoreConflict when unique values of archived rows are used in table of model"""
+    for field in model._meta.concrete_fields:
+        if not field.unique or field.primary_key:
+            continue
+        values = {data[field.attname] for data in rows if data.get(field.attname) is not None}
+        taken = sorted(model._base_manager.filter(**{field.attname + '__in': values})
+                       .values_list(field.attname, flat=True))
+        if taken:
+            raise RestoreConflict('%s %s %s is already used' % (
+                model._meta.label, field.name, ', '.join(map(str, taken))
+            ))
+
+
+def restore_rows(archived):
+    """Insert archived rows back into their tables keeping primary keys and remove them from archive
+
+    Raises RestoreConflict before inserting anything when unique value of some row is taken.
+    """
+    by_model = {}
+    for row in archived:
+        by_model.setdefault(MODELS[row.model], []).append(row.data)
+    for model, rows in by_model.items():
+        check_unique(model, rows)
+    for model in RESTORE_ORDER:
+        fields = {field.attname: field for field in model._meta.concrete_fields}
+        model.objects.bulk_create([
+            model(**{name: fields[name].to_python(value) for name, value in data.items() if name in fields})
+            for data in by_model.get(model, ())
+        ])
+    ArchivedRow.objects.filter(pk__in=[row.pk for row in archived]).delete()
+
+
+def restore(model, pk):
+    """Move archived row back together with rows archived with it and make the row live again
+
+    Archived company of restored note or contact person is restored with its own group, it stays deleted.
+    Returns number of restored rows, zero when row is not archived. Raises RestoreConflict when unique value of
+    some row was taken by live row after archival, rename or delete that row first.
+    """
+    with transaction.atomic():
+        row = ArchivedRow.objects.filter(model=model._meta.label_lower, object_id=pk).first()
+        if row is None:
+            return 0
+        archived = list(ArchivedRow.objects.filter(root_model=row.root_model, root_id=row.root_id))
+        company_ids = {row.data.get('company_id') for row in archived if row.model != Company._meta.label_lower}
+        archived += ArchivedRow.objects.filter(root_model=Company._meta.label_lower, root_id__in=company_ids).exclude(
+            pk__in=[row.pk for row in archived]
+        )
+        restore_rows(archived)
+        # Updating the flag notifies counters, fragments and change log like other undeletes
+        model.objects.filter(pk=pk).update_rows(is_deleted=False)
+    return len(archived)
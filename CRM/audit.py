@@ -0,0 +1,225 @@
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from CRM.models import ChangeLog, Company, ContactPerson, Note
+from ProgrammingWorkshop.managers import updated_values
+from ProgrammingWorkshop.signals import rows_updated
+from users.models import User
+
+logger = logging.getLogger(__name__)
+
+AUDITED = (Company, Note, ContactPerson, User)
+# Fields maintained by application itself, changes of them alone are not logged
+IGNORED_FIELDS = {'updated_at', 'last_login', 'contact_count', 'note_count'}
+MASKED_FIELDS = {'password'}
+
+# User of request being handled, None in management commands
+current_actor = ContextVar('current_actor', default=None)
+
+STOP = object()
+
+
+class ChangeLogWriter:
+    """Bounded queue of change log entries written in batches by background thread
+
+    Writes happen outside of request, a full queue makes caller write its entry itself instead of dropping it.
+    Queue is drained when process exits. With AUDIT_LOG_SYNC entries are written immediately, tests use it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self.queue = None
+        self.written = 0
+        self.batches = 0
+        self.overflows = 0
+        self.flush_time = 0.0
+        self.max_flush_time = 0.0
+
+    def record(self, entries):
+        if getattr(settings, 'AUDIT_LOG_SYNC', False):
+            self.write(entries)
+            return
+        self.start()
+        overflow = []
+        for entry in entries:
+            try:
+                self.queue.put_nowait(entry)
+            except queue.Full:
+                overflow.append(entry)
+        if overflow:
+            with self._lock:
+                self.overflows += len(overflow)
+            self.write(overflow)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.queue = queue.Queue(getattr(settings, 'AUDIT_LOG_QUEUE_SIZE', 10000))
+            self._thread = threading.Thread(target=self.run, name='change-log-writer', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def run(self):
+        batch_size = getattr(settings, 'AUDIT_LOG_BATCH_SIZE', 500)
+        interval = getattr(settings, 'AUDIT_LOG_FLUSH_INTERVAL', 1.0)
+        stopping = False
+        try:
+            while not stopping:
+                batch = [self.queue.get()]
+                deadline = time.monotonic() + interval
+                while len(batch) < batch_size and batch[-1] is not STOP:
+                    try:
+                        batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+                stopping = batch[-1] is STOP
+                entries = [entry for entry in batch if entry is not STOP]
+                try:
+                    if entries:
+                        self.write(entries)
+                except Exception:
+                    logger.exception('Writing %d change log entries failed', len(entries))
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+        finally:
+            connection.close()
+
+    def write(self, entries):
+        """Insert entries in single transaction, bulk_create opens one when it needs several queries"""
+        start = time.perf_counter()
+        ChangeLog.objects.bulk_create(entries)
+        duration = time.perf_counter() - start
+        with self._lock:
+            self.written += len(entries)
+            self.batches += 1
+            self.flush_time += duration
+            self.max_flush_time = max(self.max_flush_time, duration)
+
+    def flush(self):
+        """Wait until queued entries are written"""
+        if self._thread is not None:
+            self.queue.join()
+
+    def stop(self):
+        """Write queued entries and stop background thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self.queue.put(STOP)
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queue_depth': self.queue.qsize() if self.queue else 0,
+                'queue_size': self.queue.maxsize if self.queue else None,
+                'written': self.written,
+                'batches': self.batches,
+                'overflows': self.overflows,
+                'avg_flush_ms': self.flush_time / self.batches * 1000 if self.batches else None,
+                'max_flush_ms': self.max_flush_time * 1000,
+            }
+
+
+change_log = ChangeLogWriter()
+
+
+def json_value(name, value):
+    if name in MASKED_FIELDS:
+        return '***' if value else value
+    return value.pk if isinstance(value, Model) else value
+
+
+def entry_changes(changes):
+    return {name: [json_value(name, old), json_value(name, new)] for name, (old, new) in changes.items()
+            if name not in IGNORED_FIELDS}
+
+
+def log_changes(sender, actions):
+    """Queue change log entries of objects given as pk mapped to action and changes, updates changing only ignored
+    fields are skipped
+    """
+    actor_id = getattr(current_actor.get(), 'pk', None)
+    entries = []
+    for pk, (action, changes) in actions.items():
+        changes = entry_changes(changes)
+        if changes or action != ChangeLog.UPDATE:
+            entries.append(ChangeLog(actor_id=actor_id, model=sender._meta.label_lower, object_id=pk, action=action,
+                                     changes=changes))
+    if entries:
+        change_log.record(entries)
+
+
+def change_action(changes):
+    return ChangeLog.DELETE if changes.get('is_deleted', (False, False))[1] else ChangeLog.UPDATE
+
+
+@receiver(post_save)
+def object_saved(sender, instance, created, **kwargs):
+    if sender not in AUDITED:
+        return
+    changes = instance.changed_values()
+    log_changes(sender, {instance.pk: (ChangeLog.CREATE if created else change_action(changes), changes)})
+
+
+@receiver(post_delete)
+def object_deleted(sender, instance, **kwargs):
+    if sender in AUDITED:
+        log_changes(sender, {instance.pk: (ChangeLog.DELETE, {})})
+
+
+@receiver(rows_updated)
+def rows_changed(sender, pks, fields, values=None, previous=None, **kwargs):
+    """Log bulk updates with values each row held before and after, rows left unchanged are skipped"""
+    if sender not in AUDITED:
+        return
+    names = [sender._meta.get_field(field).attname for field in fields]
+    if not set(names) - IGNORED_FIELDS:
+        return
+    current = updated_values(sender, previous, values)
+    actions = {}
+    for pk, row in previous.items():
+        changes = {name: (row[name], current[pk][name]) for name in names if row[name] != current[pk][name]}
+        actions[pk] = (change_action(changes), changes)
+    log_changes(sender, actions)
+
+
+class AuditActorMiddleware:
+    """Make request user the actor of changes logged while request is handled"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = current_actor.set(request.user)
+        try:
+            return self.get_response(request)
+        finally:
+            current_actor.reset(token)
+
+    async def __acall__(self, request):
+        token = current_actor.set(request.user)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_actor.reset(token)
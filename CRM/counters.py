@@ -0,0 +1,75 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from CRM.models import Company, ContactPerson, Industry, Note, industries
+from ProgrammingWorkshop.managers import updated_values
+from ProgrammingWorkshop.signals import rows_updated
+
+
+def live_count(model, field):
+    """Subquery counting live rows of model pointing with field at outer row"""
+    rows = model.objects.filter(**{field: OuterRef('pk'), 'is_deleted': False}).order_by().values(field)
+    return Coalesce(Subquery(rows.annotate(count=Count('pk')).values('count'), output_field=IntegerField()), 0)
+
+
+def company_counts():
+    return {'contact_count': live_count(ContactPerson, 'company'), 'note_count': live_count(Note, 'company')}
+
+
+def recount_companies(pks):
+    """Store live contact and note counts of companies, update_rows also drops their rendered cards"""
+    pks = {pk for pk in pks if pk is not None}
+    if pks:
+        Company.objects.filter(pk__in=pks).update_rows(**company_counts())
+
+
+def recount_industries(pks=None):
+    """Store live company counts of given industries or of all of them"""
+    rows = Industry.objects.all()
+    if pks is not None:
+        pks = {pk for pk in pks if pk is not None}
+        if not pks:
+            return
+        rows = rows.filter(pk__in=pks)
+    rows.update(company_count=live_count(Company, 'industry'))
+    industries.invalidate()
+
+
+def drifted_companies(companies):
+    """Companies of query set whose stored counts differ from live rows"""
+    return companies.annotate(**{'actual_' + name: count for name, count in company_counts().items()}).filter(
+        ~Q(contact_count=F('actual_contact_count')) | ~Q(note_count=F('actual_note_count'))
+    )
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_save, sender=ContactPerson)
+@receiver(post_delete, sender=Note)
+@receiver(post_delete, sender=ContactPerson)
+def related_changed(sender, instance, **kwargs):
+    recount_companies([instance.company_id])
+
+
+@receiver(post_save, sender=Company)
+def company_saved(sender, instance, created, **kwargs):
+    changed = instance.changed_values()
+    if created or 'industry_id' in changed or 'is_deleted' in changed:
+        recount_industries([instance.industry_id, changed.get('industry_id', (None, None))[0]])
+
+
+@receiver(post_delete, sender=Company)
+def company_deleted(sender, instance, **kwargs):
+    recount_industries([instance.industry_id])
+
+
+@receiver(rows_updated)
+def rows_changed(sender, pks, fields, values=None, previous=None, **kwargs):
+    """Recount after bulk updates companies and industries rows pointed at before or after update"""
+    if sender in (Note, ContactPerson) and fields & {'is_deleted', 'company'}:
+        current = updated_values(sender, previous, values)
+        recount_companies({row['company_id'] for rows in (previous, current) for row in rows.values()})
+    elif sender is Company and fields & {'industry', 'is_deleted'}:
+        current = updated_values(sender, previous, values)
+        recount_industries({row['industry_id'] for rows in (previous, current) for row in rows.values()})
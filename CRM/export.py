@@ -0,0 +1,93 @@
+import csv
+import json
+from collections import defaultdict
+
+from CRM.models import Company, ContactPerson, Note
+
+CHUNK_SIZE = 500
+CSV_COLUMNS = ('record', 'company_nip', 'company_name', 'industry', 'address', 'city', 'user',
+               'name', 'surname', 'phone', 'mail', 'content')
+
+
+class Echo:
+    """File-like object returning written value, lets csv writer feed streamed response"""
+
+    def write(self, value):
+        return value
+
+
+def group_by_company(queryset):
+    grouped = defaultdict(list)
+    for row in queryset:
+        grouped[row.company_id].append(row)
+    return grouped
+
+
+def iterate_companies(companies, chunk_size=CHUNK_SIZE):
+    """Yield companies with their live contacts and notes, seeking on primary key chunk by chunk"""
+    last = 0
+    while True:
+        chunk = list(companies.filter(pk__gt=last).order_by('pk')[:chunk_size])
+        if not chunk:
+            return
+        ids = [company.pk for company in chunk]
+        contacts = group_by_company(ContactPerson.live.for_detail().filter(company_id__in=ids).order_by('id'))
+        notes = group_by_company(Note.live.for_detail().filter(company_id__in=ids).order_by('id'))
+        for company in chunk:
+            yield company, contacts[company.pk], notes[company.pk]
+        last = chunk[-1].pk
+
+
+def login(user):
+    return user.login if user else None
+
+
+def company_fields(company):
+    return {
+        'nip': company.nip,
+        'name': company.name,
+        'industry': company.industry.name if company.industry else None,
+        'address': company.address,
+        'city': company.city,
+        'user': login(company.user),
+    }
+
+
+def export_jsonl(companies):
+    """Yield one JSON line per company with nested contacts and notes"""
+    for company, contacts, notes in iterate_companies(companies):
+        row = company_fields(company)
+        row['contacts'] = [
+            {'name': person.name, 'surname': person.surname, 'phone': person.phone, 'mail': person.mail,
+             'user': login(person.user)}
+            for person in contacts
+        ]
+        row['notes'] = [{'content': note.content, 'user': login(note.user)} for note in notes]
+        yield json.dumps(row) + '\n'
+
+
+def export_csv(companies):
+    """Yield CSV lines, company row is followed by rows of its contacts and notes"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for company, contacts, notes in iterate_companies(companies):
+        fields = company_fields(company)
+        yield writer.writerow(['company', fields['nip'], fields['name'], fields['industry'], fields['address'],
+                               fields['city'], fields['user'], '', '', '', '', ''])
+        for person in contacts:
+            yield writer.writerow(['contact', company.nip, '', '', '', '', login(person.user),
+                                   person.name, person.surname, person.phone, person.mail, ''])
+        for note in notes:
+            yield writer.writerow(['note', company.nip, '', '', '', '', login(note.user), '', '', '', '', note.content])
+
+
+EXPORTS = {
+    'csv': (export_csv, 'text/csv'),
+    'jsonl': (export_jsonl, 'application/x-ndjson'),
+}
+
+
+def export_companies(file_format, industry=None, user=None):
+    """Return generator of exported lines of live companies matching company list filters"""
+    export, _ = EXPORTS[file_format]
+    return export(Company.live.for_list().filter_list(industry, user))
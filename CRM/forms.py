@@ -22,3 +22,12 @@ class ContactPersonForm(ModelForm):
     class Meta:
         model = ContactPerson
         exclude = ('is_deleted', 'user', 'company')
+
+
+class CompanyImportForm(CompanyForm):
+    """Form validating imported company, industry is resolved and nip upserted by importer"""
+    class Meta(CompanyForm.Meta):
+        exclude = ('is_deleted', 'user', 'industry')
+
+    def validate_unique(self):
+        pass
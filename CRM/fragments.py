@@ -0,0 +1,111 @@
+import threading
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from CRM.models import Company, Note, ContactPerson, Industry
+from ProgrammingWorkshop.signals import rows_updated
+from users.models import User
+
+GENERATION_KEY = 'fragment-generation'
+
+
+class FragmentStats:
+    """Hit and miss counters of rendered fragment cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': self.hits / total if total else None}
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+fragment_stats = FragmentStats()
+
+
+def get_cache():
+    return caches[getattr(settings, 'FRAGMENT_CACHE', 'fragments')]
+
+
+def version_key(obj):
+    return 'fragment-version:%s:%s' % (obj._meta.label_lower, obj.pk)
+
+
+def new_version(key, cache=None):
+    """Store fresh random version, evicted or missing version never matches fragments rendered before"""
+    version = uuid4().hex
+    (cache or get_cache()).set(key, version, None)
+    return version
+
+
+def fragment_key(name, obj):
+    """Return cache key of fragment from object identity, object version and generation of related data"""
+    cache = get_cache()
+    key = version_key(obj)
+    versions = cache.get_many([key, GENERATION_KEY])
+    version = versions.get(key) or new_version(key, cache)
+    generation = versions.get(GENERATION_KEY) or new_version(GENERATION_KEY, cache)
+    return 'fragment:%s:%s:%s:%s:%s' % (name, obj._meta.label_lower, obj.pk, version, generation)
+
+
+def generation():
+    """Return current generation, it changes whenever data shown on many fragments changes"""
+    cache = get_cache()
+    return cache.get(GENERATION_KEY) or new_version(GENERATION_KEY, cache)
+
+
+def invalidate(model, pks):
+    """Drop fragments of given objects"""
+    label = model._meta.label_lower
+    get_cache().delete_many(['fragment-version:%s:%s' % (label, pk) for pk in pks])
+
+
+def invalidate_all():
+    """Drop every fragment, used when data shown on many fragments changes"""
+    new_version(GENERATION_KEY)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=Note)
+@receiver(post_save, sender=ContactPerson)
+def object_saved(sender, instance, **kwargs):
+    invalidate(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Industry)
+def industry_saved(sender, **kwargs):
+    invalidate_all()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, update_fields=None, **kwargs):
+    """Fragments show author login, saves of other fields such as last login keep them"""
+    if update_fields is None or 'login' in update_fields:
+        invalidate_all()
+
+
+@receiver(rows_updated)
+def rows_changed(sender, pks, fields, **kwargs):
+    if sender in (Company, Note, ContactPerson):
+        invalidate(sender, pks)
+    elif sender is User and 'login' in fields:
+        invalidate_all()
@@ -0,0 +1,54 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from CRM.archive import ARCHIVED, archive_batch
+
+
+def database_size():
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA page_count')
+        pages = cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_size')
+        return pages * cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = 'Move rows soft deleted before threshold into archive in batches, interrupted runs continue later'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Archive rows deleted at least this many days ago')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows moved per transaction')
+        parser.add_argument('--max-seconds', type=float, help='Stop after batch exceeding this run time')
+        parser.add_argument('--vacuum', action='store_true', help='Compact SQLite database file afterwards')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        finished = True
+        for model in ARCHIVED:
+            moved = 0
+            while True:
+                if options['max_seconds'] and time.perf_counter() - start > options['max_seconds']:
+                    finished = False
+                    break
+                count = archive_batch(model, cutoff, options['batch_size'])
+                if not count:
+                    break
+                moved += count
+            self.stdout.write('%s: archived %d' % (model._meta.label_lower, moved))
+            if not finished:
+                break
+        if not finished:
+            self.stdout.write(self.style.WARNING('Time limit reached, run again to continue'))
+        elif options['vacuum'] and connection.vendor == 'sqlite':
+            size = database_size()
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+                cursor.execute('PRAGMA optimize')
+            self.stdout.write('Database compacted from %.1f MB to %.1f MB' % (size / 2 ** 20,
+                                                                              database_size() / 2 ** 20))
+        self.stdout.write(self.style.SUCCESS('Archival done in %.1f s' % (time.perf_counter() - start)))
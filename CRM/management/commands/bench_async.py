@@ -0,0 +1,91 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, AsyncClient, override_settings
+from django.urls import reverse
+
+from CRM.models import Company
+from ProgrammingWorkshop.benchmark import summarize, format_row, save
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput and tail latency of synchronous and async CRM read views under concurrent load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--login', required=True, help='Login of user sending requests')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per view and mode')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--search', default='smith', help='Searched phrase')
+        parser.add_argument('--output', help='Save results as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            self.user = User.objects.get(login=options['login'])
+        except User.DoesNotExist:
+            raise CommandError('User %s does not exist' % options['login'])
+        company = Company.live.order_by('pk').first()
+        if company is None:
+            raise CommandError('There are no companies, run seed_crm first')
+        pages = {
+            'index': (reverse('CRM:index'), reverse('CRM:async_index')),
+            'detail': (reverse('CRM:detail', args=[company.pk]), reverse('CRM:async_detail', args=[company.pk])),
+            'search': (reverse('CRM:search') + '?search=' + options['search'],
+                       reverse('CRM:async_search') + '?search=' + options['search']),
+        }
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, (sync_url, async_url) in pages.items():
+                results[name + ':wsgi'] = self.run_sync(sync_url, options['requests'], options['concurrency'])
+                results[name + ':asgi'] = asyncio.run(
+                    self.run_async(async_url, options['requests'], options['concurrency'])
+                )
+        for name, summary in results.items():
+            self.stdout.write(format_row(name, summary))
+        if options['output']:
+            save(options['output'], results)
+
+    def run_sync(self, url, requests, concurrency):
+        """Send requests through WSGI handler from pool of threads"""
+        def worker(count):
+            client = Client()
+            client.force_login(self.user)
+            latencies = []
+            for _ in range(count):
+                start = time.perf_counter()
+                client.get(url)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            latencies = sum(pool.map(worker, self.shares(requests, concurrency)), [])
+        return summarize(latencies, time.perf_counter() - start)
+
+    async def run_async(self, url, requests, concurrency):
+        """Send requests through ASGI handler from concurrent tasks of one event loop"""
+        clients = []
+        for _ in range(concurrency):
+            client = AsyncClient()
+            await asyncio.get_running_loop().run_in_executor(None, client.force_login, self.user)
+            clients.append(client)
+
+        async def worker(client, count):
+            latencies = []
+            for _ in range(count):
+                start = time.perf_counter()
+                await client.get(url)
+                latencies.append(time.perf_counter() - start)
+            return latencies
+
+        start = time.perf_counter()
+        shares = await asyncio.gather(*(
+            worker(client, count) for client, count in zip(clients, self.shares(requests, concurrency))
+        ))
+        return summarize(sum(shares, []), time.perf_counter() - start)
+
+    @staticmethod
+    def shares(requests, workers):
+        return [requests // workers + (i < requests % workers) for i in range(workers)]
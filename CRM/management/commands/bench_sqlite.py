@@ -0,0 +1,115 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from CRM.models import Company, Note
+from ProgrammingWorkshop.benchmark import summarize, format_row, save
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Measure throughput of concurrent page reads and note writes with current database profile. '
+            'Run once with --journal-mode delete and once with DATABASE_PROFILE=production and --compare.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--login', required=True, help='Login of user sending requests')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of load')
+        parser.add_argument('--readers', type=int, default=8, help='Threads requesting read-only pages')
+        parser.add_argument('--writers', type=int, default=2, help='Threads adding notes')
+        parser.add_argument('--journal-mode', choices=('delete', 'wal'), help='Switch database journal before run')
+        parser.add_argument('--output', help='Save results as JSON')
+        parser.add_argument('--compare', help='JSON results of earlier run to print differences against')
+
+    def handle(self, *args, **options):
+        try:
+            self.user = User.objects.get(login=options['login'])
+        except User.DoesNotExist:
+            raise CommandError('User %s does not exist' % options['login'])
+        self.companies = list(Company.live.order_by('-pk').values_list('pk', flat=True)[:1000])
+        if not self.companies:
+            raise CommandError('There are no companies, run seed_crm first')
+        with connection.cursor() as cursor:
+            if options['journal_mode']:
+                cursor.execute('PRAGMA journal_mode = %s' % options['journal_mode'])
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        last_note = Note.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        self.deadline = time.perf_counter() + options['duration']
+        workers = [self.read] * options['readers'] + [self.write] * options['writers']
+        start = time.perf_counter()
+        with override_settings(ALLOWED_HOSTS=['testserver']), ThreadPoolExecutor(len(workers)) as pool:
+            shares = list(pool.map(lambda worker: worker(), workers))
+        elapsed = time.perf_counter() - start
+        Note.objects.filter(pk__gt=last_note, user=self.user).delete()
+
+        results = {
+            'profile': {
+                'journal_mode': journal_mode,
+                'conn_max_age': settings.DATABASES['default'].get('CONN_MAX_AGE', 0),
+                'read_database': getattr(settings, 'READ_DATABASE', None),
+                'pragmas': getattr(settings, 'SQLITE_PRAGMAS', {}),
+            },
+        }
+        for kind in ('reads', 'writes'):
+            kind_shares = [share for share in shares if share[1] == kind]
+            results[kind] = summarize(sum((share[0] for share in kind_shares), []), elapsed,
+                                      errors=sum(share[2] for share in kind_shares))
+
+        earlier = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                earlier = json.load(file)
+        self.stdout.write('journal %(journal_mode)s, CONN_MAX_AGE %(conn_max_age)s, read database %(read_database)s'
+                          % results['profile'])
+        for kind in ('reads', 'writes'):
+            summary = results[kind]
+            line = format_row(kind, summary) + '  %d errors' % summary['errors']
+            if kind in earlier and earlier[kind]['throughput']:
+                line += '  throughput %+.0f%%' % ((summary['throughput'] / earlier[kind]['throughput'] - 1) * 100)
+            self.stdout.write(line)
+        if options['output']:
+            save(options['output'], results)
+
+    def client(self):
+        client = Client()
+        client.force_login(self.user)
+        return client
+
+    def run(self, kind, request):
+        """Repeat request until deadline, return latencies, kind and number of failed requests"""
+        latencies, errors = [], 0
+        try:
+            client = self.client()
+            while time.perf_counter() < self.deadline:
+                start = time.perf_counter()
+                try:
+                    response = request(client)
+                    if response.status_code >= 400:
+                        errors += 1
+                    else:
+                        latencies.append(time.perf_counter() - start)
+                except Exception:
+                    errors += 1
+                # Test client does not end requests like WSGI handler, connections follow CONN_MAX_AGE here
+                close_old_connections()
+        finally:
+            connections.close_all()
+        return latencies, kind, errors
+
+    def read(self):
+        pages = [reverse('CRM:index')] + [reverse('CRM:detail', args=[pk]) for pk in self.companies[:50]]
+        return self.run('reads', lambda client: client.get(random.choice(pages)))
+
+    def write(self):
+        return self.run('writes', lambda client: client.post(
+            reverse('CRM:add_note', args=[random.choice(self.companies)]),
+            {'content': 'Benchmark note %d' % threading.get_ident()}
+        ))
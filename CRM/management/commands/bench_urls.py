@@ -0,0 +1,111 @@
+import json
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import URLPattern, reverse
+
+from CRM import url as crm_urls
+from CRM.models import Company, ContactPerson, Note
+from ProgrammingWorkshop.benchmark import summarize, format_row, save
+from users import url as users_urls
+from users.models import User
+
+# Views left out by default, they change state of the session or stream whole database
+SKIPPED = ('users:logout', 'CRM:export')
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Request every page of CRM and users apps and report latency percentiles and queries per request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--login', required=True, help='Login of user sending requests, use moderator')
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per URL')
+        parser.add_argument('--warmup', type=int, default=3, help='Requests per URL sent before measuring')
+        parser.add_argument('--include', nargs='*', default=(), help='Skipped URL names to measure anyway')
+        parser.add_argument('--output', help='Save results as JSON')
+        parser.add_argument('--compare', help='JSON results of earlier run to print differences against')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(login=options['login'])
+        except User.DoesNotExist:
+            raise CommandError('User %s does not exist' % options['login'])
+        client = Client()
+        client.force_login(user)
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, url in self.urls(user, options['include']):
+                for _ in range(options['warmup']):
+                    self.get(client, url)
+                latencies, queries = [], []
+                start = time.perf_counter()
+                for _ in range(options['requests']):
+                    latency, count = self.get(client, url)
+                    latencies.append(latency)
+                    queries.append(count)
+                results[name] = summarize(latencies, time.perf_counter() - start, url=url,
+                                          queries=max(queries) if queries else None)
+        earlier = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                earlier = json.load(file).get('urls', {})
+        for name, summary in results.items():
+            line = format_row(name, summary) + '  %3s queries' % summary['queries']
+            if name in earlier and earlier[name]['p95']:
+                line += '  p95 %+.0f%%' % ((summary['p95'] / earlier[name]['p95'] - 1) * 100)
+            self.stdout.write(line)
+        if options['output']:
+            save(options['output'], {'commit': commit(), 'requests': options['requests'], 'urls': results})
+
+    @staticmethod
+    def get(client, url):
+        """Return latency and number of queries of one request"""
+        start = time.perf_counter()
+        response = client.get(url)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        latency = time.perf_counter() - start
+        counter = getattr(response.wsgi_request, 'query_counter', None)
+        return latency, counter.count if counter else None
+
+    def urls(self, user, include):
+        """Yield URL name and path of every GET page with arguments pointing at existing rows"""
+        company = Company.live.order_by('pk').first()
+        if company is None:
+            raise CommandError('There are no companies, run seed_crm first')
+        note = Note.live.filter(company=company).first()
+        person = ContactPerson.live.filter(company=company).first()
+        arguments = {
+            'page_num': 1,
+            'company_id': company.pk,
+            'user_id': user.pk,
+            'CRM:edit_note': note.pk if note else None,
+            'CRM:edit_person': person.pk if person else None,
+        }
+        queries = {'CRM:search': '?search=' + (person.surname if person else 'smith')}
+        for module in (crm_urls, users_urls):
+            for pattern in module.urlpatterns:
+                if not isinstance(pattern, URLPattern):
+                    continue
+                name = '%s:%s' % (module.app_name, pattern.name)
+                view = getattr(pattern.callback, 'view_class', None)
+                if (name in SKIPPED and name not in include) or (view and not hasattr(view, 'get')):
+                    continue
+                kwargs = {
+                    key: arguments.get(name) if key == 'model_id' else arguments[key]
+                    for key in pattern.pattern.converters
+                }
+                if None in kwargs.values():
+                    continue
+                path = reverse(name, kwargs=kwargs) + queries.get(name, '')
+                yield '%s %s' % (name, ' '.join('%s=%s' % item for item in kwargs.items())) if kwargs else name, path
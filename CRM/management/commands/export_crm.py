@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from CRM.export import EXPORTS, export_companies
+
+
+class Command(BaseCommand):
+    help = 'Stream live companies with their contacts and notes as CSV or JSON lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORTS, default='csv')
+        parser.add_argument('--filter', help='Industry id, same as company list filter')
+        parser.add_argument('--user', help='Id of user who added companies')
+        parser.add_argument('--output', help='Output file, defaults to standard output')
+
+    def handle(self, *args, **options):
+        lines = export_companies(options['format'], options['filter'], options['user'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            output.writelines(lines)
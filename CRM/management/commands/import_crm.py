@@ -0,0 +1,179 @@
+import csv
+import json
+import sys
+import time
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from CRM.counters import recount_companies, recount_industries
+from CRM.forms import CompanyImportForm, NoteForm, ContactPersonForm
+from CRM.models import Company, Industry, Note, ContactPerson
+from CRM.reports import count_companies, count_related
+from CRM.sync import touch_inserted
+from ProgrammingWorkshop.managers import field_names
+from ProgrammingWorkshop.signals import rows_updated
+from users.models import User
+
+MODELS = {
+    'company': (Company, CompanyImportForm),
+    'contact': (ContactPerson, ContactPersonForm),
+    'note': (Note, NoteForm),
+}
+# Upserted companies which were soft deleted are restored
+COMPANY_UPDATE_FIELDS = ('name', 'industry', 'address', 'city', 'is_deleted')
+
+
+def read_rows(stream, file_format):
+    """Yield numbered rows of CSV or JSON lines stream, malformed lines are yielded as None"""
+    if file_format == 'csv':
+        yield from enumerate(csv.DictReader(stream), 1)
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    return iter(lambda: list(islice(rows, size)), [])
+
+
+class Command(BaseCommand):
+    help = 'Stream companies, contact people or notes from CSV or JSON lines file into database in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON lines file, - reads standard input')
+        parser.add_argument('--model', choices=MODELS, required=True,
+                            help='Imported rows, contacts and notes reference company by its nip')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='Defaults to file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--user', help='Login of user set as author of imported rows')
+        parser.add_argument('--create-industries', action='store_true', help='Add unknown industries')
+        parser.add_argument('--rejects', help='File receiving rejected rows as JSON lines, defaults to stderr')
+
+    def handle(self, *args, **options):
+        self.model, self.form = MODELS[options['model']]
+        self.create_industries = options['create_industries']
+        self.user = None
+        if options['user']:
+            try:
+                self.user = User.objects.get(login=options['user'])
+            except User.DoesNotExist:
+                raise CommandError('User %s does not exist' % options['user'])
+        self.industries = {name.lower(): pk for pk, name in Industry.objects.values_list('id', 'name')}
+        file_format = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.json')) else 'csv')
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8')
+        rejects = open(options['rejects'], 'w', encoding='utf-8') if options['rejects'] else self.stderr
+        imported = rejected = 0
+        start = time.perf_counter()
+        try:
+            for batch in batches(read_rows(stream, file_format), options['batch_size']):
+                instances, errors = self.validate(batch)
+                with transaction.atomic():
+                    self.write(instances)
+                imported += len(instances)
+                rejected += len(errors)
+                for error in errors:
+                    rejects.write(json.dumps(error) + '\n')
+                self.report(imported, rejected, start)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if options['rejects']:
+                rejects.close()
+        self.stdout.write(self.style.SUCCESS('Imported %d rows, rejected %d' % (imported, rejected)))
+
+    def report(self, imported, rejected, start):
+        elapsed = time.perf_counter() - start
+        self.stdout.write('%d imported, %d rejected, %.0f rows/s' % (
+            imported, rejected, (imported + rejected) / elapsed if elapsed else 0
+        ))
+
+    def validate(self, batch):
+        """Return model instances of valid rows and errors of rejected ones, last of companies sharing nip is kept"""
+        companies = {}
+        if self.model is not Company:
+            nips = {row.get('company') for _, row in batch if row}
+            companies = dict(Company.objects.filter(nip__in=nips).values_list('nip', 'id'))
+        instances, errors = [], []
+        for number, row in batch:
+            if row is None:
+                errors.append({'row': number, 'errors': {'__all__': ['Malformed row']}})
+                continue
+            form = self.form(row)
+            if not form.is_valid():
+                errors.append({'row': number, 'errors': {field: list(error) for field, error in form.errors.items()}})
+                continue
+            instance = form.save(commit=False)
+            instance.user = self.user
+            if self.model is Company:
+                error = self.resolve_industry(instance, row.get('industry'))
+            else:
+                instance.company_id = companies.get(row.get('company'))
+                error = None if instance.company_id else 'Unknown company %s' % row.get('company')
+            if error:
+                errors.append({'row': number, 'errors': {'__all__': [error]}})
+            else:
+                instances.append((number, instance))
+        if self.model is Company:
+            instances = self.last_of_nips(instances, errors)
+        return [instance for _, instance in instances], errors
+
+    @staticmethod
+    def last_of_nips(instances, errors):
+        """Keep last of numbered companies sharing nip, add errors of earlier ones"""
+        last = {instance.nip: number for number, instance in instances}
+        for number, instance in instances:
+            if last[instance.nip] != number:
+                error = 'Duplicate nip in batch, row %d is imported' % last[instance.nip]
+                errors.append({'row': number, 'errors': {'nip': [error]}})
+        return [(number, instance) for number, instance in instances if last[instance.nip] == number]
+
+    def resolve_industry(self, company, name):
+        """Set company industry from in-memory map, return error if industry is unknown"""
+        if not name:
+            return None
+        company.industry_id = self.industries.get(name.lower())
+        if company.industry_id is None:
+            if not self.create_industries:
+                return 'Unknown industry %s' % name
+            company.industry_id = self.industries[name.lower()] = Industry.objects.create(name=name).pk
+        return None
+
+    def write(self, instances):
+        """Insert batch, companies with already known nip are updated instead"""
+        # bulk_create does not set primary keys on SQLite, rows after last one are the inserted ones
+        last = self.model.objects.order_by('-pk').values_list('pk', flat=True).first()
+        if self.model is not Company:
+            self.model.objects.bulk_create(instances)
+            touch_inserted(self.model, last)
+            recount_companies({instance.company_id for instance in instances})
+            count_related(self.model, Counter(instance.company_id for instance in instances if not instance.is_deleted))
+            return
+        companies = {company.nip: company for company in instances}
+        existing = {row['nip']: row for row in Company.objects.filter(nip__in=companies)
+                    .values('pk', *field_names(Company))}
+        updated = []
+        now = timezone.now()
+        for nip, row in existing.items():
+            company = companies.pop(nip)
+            company.pk = row['pk']
+            company.updated_at = now
+            updated.append(company)
+        Company.objects.bulk_create(companies.values())
+        touch_inserted(Company, last)
+        recount_industries({company.industry_id for company in companies.values()})
+        count_companies(companies.values())
+        Company.objects.bulk_update(updated, COMPANY_UPDATE_FIELDS + ('updated_at',))
+        if updated:
+            rows_updated.send(sender=Company, pks=[company.pk for company in updated],
+                              fields=set(COMPANY_UPDATE_FIELDS), previous={row['pk']: row for row in existing.values()})
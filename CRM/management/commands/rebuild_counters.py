@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from CRM.counters import drifted_companies, recount_companies, recount_industries
+from CRM.models import Company
+from CRM.reports import refresh_company_ids
+
+
+class Command(BaseCommand):
+    help = 'Recount live contacts and notes of companies and live companies of industries, fixing drifted counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Companies checked per query')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        fixed = checked = 0
+        last = 0
+        while True:
+            batch = list(Company.objects.filter(pk__gt=last).order_by('pk')
+                         .values_list('pk', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            companies = Company.objects.filter(pk__gte=batch[0], pk__lte=batch[-1])
+            drifted = list(drifted_companies(companies).values_list('pk', flat=True))
+            recount_companies(drifted)
+            refresh_company_ids(drifted)
+            fixed += len(drifted)
+            checked += len(batch)
+            last = batch[-1]
+        recount_industries()
+        self.stdout.write(self.style.SUCCESS('Checked %d companies, fixed %d, recounted industries in %.1f s' % (
+            checked, fixed, time.perf_counter() - start
+        )))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from CRM.reports import DIMENSIONS, drifted, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Regroup live companies, contacts and notes into report rows, repairing rows which drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dimension', choices=DIMENSIONS, action='append', help='Rebuild only given dimensions')
+        parser.add_argument('--check', action='store_true', help='Only report drifted rows')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        for dimension in options['dimension'] or DIMENSIONS:
+            keys = drifted(dimension)
+            self.stdout.write('%s: %d drifted rows' % (dimension, len(keys)))
+            if keys and not options['check']:
+                rebuild([dimension])
+        self.stdout.write(self.style.SUCCESS('Done in %.1f s' % (time.perf_counter() - start)))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from CRM.archive import MODELS, RestoreConflict, restore
+
+
+class Command(BaseCommand):
+    help = 'Move archived row and rows archived with it back into their tables and undelete it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=MODELS, help='Model label of archived row')
+        parser.add_argument('id', type=int, help='Primary key of archived row')
+
+    def handle(self, *args, **options):
+        try:
+            count = restore(MODELS[options['model']], options['id'])
+        except RestoreConflict as error:
+            raise CommandError(error)
+        if not count:
+            raise CommandError('%s %d is not archived' % (options['model'], options['id']))
+        self.stdout.write(self.style.SUCCESS('Restored %d rows' % count))
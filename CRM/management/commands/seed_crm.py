@@ -0,0 +1,121 @@
+import random
+import time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from CRM.counters import recount_companies, recount_industries
+from CRM.models import Company, ContactPerson, Industry, Note
+from CRM.reports import rebuild
+from CRM.sync import register_missing
+from users.models import Role, User
+
+ROLES = ('admin', 'moderator', 'regular user')
+INDUSTRIES = ('IT', 'Finance', 'Retail', 'Logistics', 'Construction', 'Energy', 'Healthcare', 'Education',
+              'Manufacturing', 'Telecommunication', 'Agriculture', 'Media', 'Tourism', 'Automotive', 'Insurance')
+NAMES = ('Jan', 'Anna', 'Piotr', 'Maria', 'Tomasz', 'Katarzyna', 'Pawel', 'Agnieszka', 'Michal', 'Ewa',
+         'Krzysztof', 'Magdalena', 'Andrzej', 'Joanna', 'Marcin', 'Barbara')
+SURNAMES = ('Nowak', 'Kowalski', 'Wisniewski', 'Wojcik', 'Kowalczyk', 'Kaminski', 'Lewandowski', 'Zielinski',
+            'Szymanski', 'Wozniak', 'Dabrowski', 'Kozlowski', 'Jankowski', 'Mazur', 'Kwiatkowski', 'Krawczyk')
+CITIES = ('Warszawa', 'Krakow', 'Lodz', 'Wroclaw', 'Poznan', 'Gdansk', 'Szczecin', 'Bydgoszcz', 'Lublin',
+          'Bialystok', 'Katowice', 'Gdynia', 'Czestochowa', 'Radom', 'Torun', 'Kielce')
+WORDS = ('meeting', 'offer', 'invoice', 'call', 'contract', 'discount', 'delivery', 'complaint', 'renewal',
+         'presentation', 'budget', 'order', 'follow', 'up', 'next', 'week', 'signed', 'pending', 'sent')
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    return iter(lambda: list(islice(iterator, size)), [])
+
+
+class Command(BaseCommand):
+    help = 'Generate realistic roles, users, industries, companies, contact people and notes in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=1000)
+        parser.add_argument('--contacts-per-company', type=int, default=3)
+        parser.add_argument('--notes-per-company', type=int, default=5)
+        parser.add_argument('--users', type=int, help='Defaults to one user per 100 companies')
+        parser.add_argument('--deleted', type=float, default=0.05, help='Part of rows marked deleted')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Companies written per transaction')
+        parser.add_argument('--prefix', default='seed', help='Prefix of generated logins')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, same seed gives same data')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.deleted = options['deleted']
+        start = time.perf_counter()
+        roles = [Role.objects.get_or_create(role_name=name)[0] for name in ROLES]
+        for name in INDUSTRIES:
+            Industry.objects.get_or_create(name=name)
+        industries = list(Industry.objects.values_list('id', flat=True))
+        user_ids = self.create_users(options['users'] or max(1, options['companies'] // 100), roles,
+                                     options['prefix'])
+        # Numbering continues after highest numeric nip, counts drop with archived or deleted companies
+        last = Company.objects.filter(nip__regex=r'^[0-9]{10}$').aggregate(last=Max('nip'))['last']
+        offset = int(last) + 1 if last else 0
+        rows = 0
+        for batch in chunks(range(offset, offset + options['companies']), options['batch_size']):
+            with transaction.atomic():
+                rows += self.create_companies(batch, industries, user_ids, options['contacts_per_company'],
+                                              options['notes_per_company'])
+            elapsed = time.perf_counter() - start
+            self.stdout.write('%d rows, %.0f rows/s' % (rows, rows / elapsed if elapsed else 0))
+        recount_industries()
+        rebuild()
+        register_missing()
+        self.stdout.write(self.style.SUCCESS('Generated %d rows in %.1f s' % (rows, time.perf_counter() - start)))
+
+    def is_deleted(self):
+        return self.random.random() < self.deleted
+
+    def create_users(self, count, roles, prefix):
+        """Create users sharing one password hash, their password is the login prefix"""
+        password = make_password(prefix)
+        offset = User.objects.filter(login__startswith=prefix).count()
+        weights = (1, 5, 94)
+        User.objects.bulk_create((
+            User(login='%s%d' % (prefix, i), password=password, name=self.random.choice(NAMES),
+                 surname=self.random.choice(SURNAMES), date_of_birth='19%02d-%02d-%02d' % (
+                     self.random.randint(50, 99), self.random.randint(1, 12), self.random.randint(1, 28)),
+                 role_id=self.random.choices(roles, weights)[0], is_deleted=self.is_deleted())
+            for i in range(offset, offset + count)
+        ), batch_size=1000, ignore_conflicts=True)
+        return list(User.objects.filter(login__startswith=prefix).values_list('id', flat=True))
+
+    def create_companies(self, numbers, industries, user_ids, contacts, notes):
+        """Create companies of batch with their contact people and notes, return number of rows"""
+        choice = self.random.choice
+        companies = [
+            Company(name='%s %s' % (choice(SURNAMES), choice(('SA', 'Sp. z o.o.', 'S.C.', 'Group'))),
+                    nip='%010d' % number, industry_id=choice(industries), address='ul. %s %d' % (
+                        choice(SURNAMES), self.random.randint(1, 200)), city=choice(CITIES),
+                    user_id=choice(user_ids), is_deleted=self.is_deleted())
+            for number in numbers
+        ]
+        # bulk_create does not set primary keys on SQLite, rows after last one are the inserted ones, so contacts
+        # and notes never go to existing companies whose nip conflicted
+        last = Company.objects.order_by('-pk').values_list('pk', flat=True).first()
+        Company.objects.bulk_create(companies, ignore_conflicts=True)
+        company_ids = list(Company.objects.filter(pk__gt=last or 0).values_list('id', flat=True))
+        people = []
+        for company_id in company_ids:
+            for _ in range(contacts):
+                name, surname = choice(NAMES), choice(SURNAMES)
+                people.append(ContactPerson(
+                    name=name, surname=surname, phone='%09d' % self.random.randint(500000000, 899999999),
+                    mail='%s.%s%d@example.com' % (name.lower(), surname.lower(), self.random.randint(1, 999)),
+                    company_id=company_id, user_id=choice(user_ids), is_deleted=self.is_deleted()
+                ))
+        ContactPerson.objects.bulk_create(people)
+        company_notes = [
+            Note(content=' '.join(self.random.choices(WORDS, k=self.random.randint(5, 40))).capitalize(),
+                 company_id=company_id, user_id=choice(user_ids), is_deleted=self.is_deleted())
+            for company_id in company_ids for _ in range(notes)
+        ]
+        Note.objects.bulk_create(company_notes)
+        recount_companies(company_ids)
+        return len(company_ids) + len(people) + len(company_notes)
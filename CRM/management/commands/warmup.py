@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from ProgrammingWorkshop.warmup import PHASES, warm_up
+
+
+class Command(BaseCommand):
+    help = 'Build URL resolver, compile project templates and open database connections, report time of each phase'
+
+    def handle(self, *args, **options):
+        timings, counts = warm_up()
+        for name, _ in PHASES:
+            self.stdout.write('%-10s %8.1f ms  %d' % (name, timings[name], counts[name]))
+        self.stdout.write(self.style.SUCCESS('Warmed up in %.1f ms' % timings['total']))
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+FTS_SQL = [
+    """CREATE VIRTUAL TABLE CRM_contactperson_fts USING fts5(
+        name, surname, mail, phone, company, tokenize='trigram'
+    )""",
+    """INSERT INTO CRM_contactperson_fts(rowid, name, surname, mail, phone, company)
+        SELECT person.id, person.name, person.surname, person.mail, person.phone, company.name
+        FROM CRM_contactperson person LEFT JOIN CRM_company company ON company.id = person.company_id
+        WHERE person.is_deleted = 0""",
+    """CREATE TRIGGER CRM_contactperson_fts_insert AFTER INSERT ON CRM_contactperson WHEN NEW.is_deleted = 0 BEGIN
+        INSERT INTO CRM_contactperson_fts(rowid, name, surname, mail, phone, company)
+        VALUES (NEW.id, NEW.name, NEW.surname, NEW.mail, NEW.phone,
+                (SELECT name FROM CRM_company WHERE id = NEW.company_id));
+    END""",
+    """CREATE TRIGGER CRM_contactperson_fts_update
+        AFTER UPDATE OF name, surname, mail, phone, company_id, is_deleted ON CRM_contactperson BEGIN
+        DELETE FROM CRM_contactperson_fts WHERE rowid = OLD.id;
+        INSERT INTO CRM_contactperson_fts(rowid, name, surname, mail, phone, company)
+        SELECT NEW.id, NEW.name, NEW.surname, NEW.mail, NEW.phone,
+               (SELECT name FROM CRM_company WHERE id = NEW.company_id)
+        WHERE NEW.is_deleted = 0;
+    END""",
+    """CREATE TRIGGER CRM_contactperson_fts_delete AFTER DELETE ON CRM_contactperson BEGIN
+        DELETE FROM CRM_contactperson_fts WHERE rowid = OLD.id;
+    END""",
+    """CREATE TRIGGER CRM_company_fts_update AFTER UPDATE OF name ON CRM_company BEGIN
+        UPDATE CRM_contactperson_fts SET company = NEW.name
+        WHERE rowid IN (SELECT id FROM CRM_contactperson WHERE company_id = NEW.id AND is_deleted = 0);
+    END""",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS CRM_company_fts_update',
+    'DROP TRIGGER IF EXISTS CRM_contactperson_fts_delete',
+    'DROP TRIGGER IF EXISTS CRM_contactperson_fts_update',
+    'DROP TRIGGER IF EXISTS CRM_contactperson_fts_insert',
+    'DROP TABLE IF EXISTS CRM_contactperson_fts',
+]
+
+
+def run_sqlite(statements):
+    """Execute statements only on SQLite, other databases search without the index"""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRM', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(FTS_SQL), run_sqlite(DROP_SQL)),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-17 15:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRM', '0002_contactperson_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['id'], name='crm_company_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['industry', 'id'], name='crm_company_industry_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactperson',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['company', 'id'], name='crm_contact_company_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['company', 'id'], name='crm_note_company_live_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.1.14 on 2026-10-17 15:39
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+fts = import_module('CRM.migrations.0002_contactperson_fts')
+
+# SQLite adds columns by rebuilding tables, which drops full text search triggers of rebuilt tables
+TRIGGER_SQL = [statement for statement in fts.FTS_SQL if statement.startswith('CREATE TRIGGER')]
+DROP_TRIGGER_SQL = [statement for statement in fts.DROP_SQL if statement.startswith('DROP TRIGGER')]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRM', '0003_live_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fts.run_sqlite(DROP_TRIGGER_SQL), fts.run_sqlite(TRIGGER_SQL)),
+        migrations.AddField(
+            model_name='company',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='contactperson',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['updated_at'], name='crm_company_updated_idx'),
+        ),
+        migrations.RunPython(fts.run_sqlite(TRIGGER_SQL), fts.run_sqlite(DROP_TRIGGER_SQL)),
+    ]
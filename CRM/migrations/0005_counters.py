@@ -0,0 +1,50 @@
+# Generated by Django 3.1.14 on 2026-10-17 15:43
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+updated_at = import_module('CRM.migrations.0004_updated_at')
+fts = updated_at.fts
+
+
+def live_count(model, field):
+    rows = model.objects.filter(**{field: OuterRef('pk'), 'is_deleted': False}).order_by().values(field)
+    return Coalesce(Subquery(rows.annotate(count=Count('pk')).values('count'), output_field=IntegerField()), 0)
+
+
+def count_rows(apps, schema_editor):
+    Company = apps.get_model('CRM', 'Company')
+    Company.objects.update(contact_count=live_count(apps.get_model('CRM', 'ContactPerson'), 'company'),
+                           note_count=live_count(apps.get_model('CRM', 'Note'), 'company'))
+    apps.get_model('CRM', 'Industry').objects.update(company_count=live_count(Company, 'industry'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRM', '0004_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(fts.run_sqlite(updated_at.DROP_TRIGGER_SQL), fts.run_sqlite(updated_at.TRIGGER_SQL)),
+        migrations.AddField(
+            model_name='company',
+            name='contact_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='note_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='industry',
+            name='company_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fts.run_sqlite(updated_at.TRIGGER_SQL), fts.run_sqlite(updated_at.DROP_TRIGGER_SQL)),
+        migrations.RunPython(count_rows, migrations.RunPython.noop),
+    ]
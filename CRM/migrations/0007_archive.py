@@ -0,0 +1,43 @@
+# Generated by Django 3.1.14 on 2026-10-17 15:50
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRM', '0006_changelog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=40)),
+                ('object_id', models.PositiveIntegerField()),
+                ('root_model', models.CharField(max_length=40)),
+                ('root_id', models.PositiveIntegerField()),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='contactperson',
+            index=models.Index(condition=models.Q(is_deleted=True), fields=['updated_at'], name='crm_contact_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(condition=models.Q(is_deleted=True), fields=['updated_at'], name='crm_note_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedrow',
+            index=models.Index(fields=['root_model', 'root_id'], name='crm_archivedrow_root_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='archivedrow',
+            constraint=models.UniqueConstraint(fields=('model', 'object_id'), name='crm_archivedrow_object_uniq'),
+        ),
+    ]
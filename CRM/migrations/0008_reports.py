@@ -0,0 +1,56 @@
+# Generated by Django 3.1.14 on 2026-10-17 15:56
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+
+
+def summarize(apps, schema_editor):
+    Company = apps.get_model('CRM', 'Company')
+    ReportRow = apps.get_model('CRM', 'ReportRow')
+    for dimension, field in (('industry', 'industry_id'), ('city', 'city'), ('user', 'user_id')):
+        rows = Company.objects.filter(is_deleted=False).order_by().values(field).annotate(
+            companies=Count('pk'), contacts=Coalesce(Sum('contact_count'), 0), notes=Coalesce(Sum('note_count'), 0)
+        )
+        totals = {row.pop(field): row for row in rows}
+        ReportRow.objects.bulk_create(
+            ReportRow(dimension=dimension, key='' if key is None else str(key), **values) for key, values in totals.items()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRM', '0007_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportRow',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('industry', 'Industry'), ('city', 'City'), ('user', 'Owner')], max_length=8)),
+                ('key', models.CharField(blank=True, max_length=40)),
+                ('companies', models.PositiveIntegerField(default=0)),
+                ('contacts', models.PositiveIntegerField(default=0)),
+                ('notes', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['city', 'id'], name='crm_company_city_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['user', 'id'], name='crm_company_user_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reportrow',
+            index=models.Index(fields=['dimension', '-companies', 'key'], name='crm_reportrow_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reportrow',
+            constraint=models.UniqueConstraint(fields=('dimension', 'key'), name='crm_reportrow_key_uniq'),
+        ),
+        migrations.RunPython(summarize, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.14 on 2026-10-17 16:03
+
+from django.db import migrations, models
+
+
+def register(apps, schema_editor):
+    """Start change sequence with every existing row, clients syncing from zero fetch them all"""
+    SyncChange = apps.get_model('CRM', 'SyncChange')
+    for name in ('Company', 'ContactPerson', 'Note'):
+        model = apps.get_model('CRM', name)
+        label = 'CRM.%s' % name.lower()
+        pks = model.objects.order_by('pk').values_list('pk', flat=True).iterator()
+        SyncChange.objects.bulk_create((SyncChange(model=label, object_id=pk) for pk in pks), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRM', '0008_reports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=40)),
+                ('object_id', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='syncchange',
+            constraint=models.UniqueConstraint(fields=('model', 'object_id'), name='crm_syncchange_object_uniq'),
+        ),
+        migrations.RunPython(register, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-17 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('CRM', '0009_sync'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contactperson',
+            index=models.Index(fields=['company', 'updated_at'], name='crm_contact_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['company', 'updated_at'], name='crm_note_updated_idx'),
+        ),
+    ]
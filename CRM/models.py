@@ -1,16 +1,81 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Max, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from ProgrammingWorkshop.cache import ReferenceCache
+from ProgrammingWorkshop.managers import SoftDeleteQuerySet, LiveManager
+from ProgrammingWorkshop.tracking import LoadedValuesMixin
 from users.models import User
 
 
 class Industry(models.Model):
     """Database model for industries"""
     name = models.CharField(max_length=30)
+    company_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
 
 
-class Company(models.Model):
+industries = ReferenceCache(Industry)
+
+
+class CompanyQuerySet(SoftDeleteQuerySet):
+    """Query set loading relations rendered with companies"""
+
+    def for_list(self):
+        """Load industry and author shown on company cards"""
+        return self.select_related('industry', 'user')
+
+    def for_detail(self):
+        """Load industry and author shown on company detail"""
+        return self.select_related('industry', 'user')
+
+    def filter_list(self, industry=None, user=None):
+        """Filter companies by industry and author ids given as company list parameters"""
+        companies = self
+        if industry:
+            companies = companies.filter(industry__id=industry)
+        if user:
+            companies = companies.filter(user__id=user)
+        return companies
+
+    def last_change(self):
+        """Latest modification time of any company, deletes and restores also move it"""
+        return self.aggregate(last_change=Max('updated_at'))['last_change']
+
+    def detail_changes(self, pk):
+        """Return latest modification times of company and of its notes and contact people with one query"""
+        def latest(model):
+            return Subquery(model.objects.filter(company=OuterRef('pk')).order_by('-updated_at')
+                            .values('updated_at')[:1])
+        return self.filter(pk=pk).annotate(
+            notes_changed=latest(Note), contacts_changed=latest(ContactPerson)
+        ).values_list('updated_at', 'notes_changed', 'contacts_changed').first()
+
+
+class NoteQuerySet(SoftDeleteQuerySet):
+    """Query set loading relations rendered with notes"""
+
+    def for_detail(self):
+        """Load author shown on company detail"""
+        return self.select_related('user')
+
+
+class ContactPersonQuerySet(SoftDeleteQuerySet):
+    """Query set loading relations rendered with contact people"""
+
+    def for_detail(self):
+        """Load author shown on company detail"""
+        return self.select_related('user')
+
+    def for_search(self):
+        """Load author and company shown on search results"""
+        return self.select_related('user', 'company')
+
+
+class Company(LoadedValuesMixin, models.Model):
     """Database model for companies"""
     name = models.CharField(max_length=30)
     nip = models.CharField(max_length=10, unique=True)
@@ -19,23 +84,51 @@ class Company(models.Model):
     city = models.CharField(max_length=40)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     is_deleted = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    contact_count = models.PositiveIntegerField(default=0, editable=False)
+    note_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CompanyQuerySet.as_manager()
+    live = LiveManager.from_queryset(CompanyQuerySet)()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=Q(is_deleted=False), name='crm_company_live_idx'),
+            models.Index(fields=['industry', 'id'], condition=Q(is_deleted=False),
+                         name='crm_company_industry_live_idx'),
+            models.Index(fields=['updated_at'], name='crm_company_updated_idx'),
+            models.Index(fields=['city', 'id'], condition=Q(is_deleted=False), name='crm_company_city_live_idx'),
+            models.Index(fields=['user', 'id'], condition=Q(is_deleted=False), name='crm_company_user_live_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Note(models.Model):
+class Note(LoadedValuesMixin, models.Model):
     """Database model for notes"""
     content = models.TextField()
     is_deleted = models.BooleanField(default=False)
     company = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = NoteQuerySet.as_manager()
+    live = LiveManager.from_queryset(NoteQuerySet)()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'id'], condition=Q(is_deleted=False), name='crm_note_company_live_idx'),
+            models.Index(fields=['updated_at'], condition=Q(is_deleted=True), name='crm_note_deleted_idx'),
+            # Latest change of company notes for detail ETag, deleted notes included
+            models.Index(fields=['company', 'updated_at'], name='crm_note_updated_idx'),
+        ]
 
     def __str__(self):
         return self.content
 
 
-class ContactPerson(models.Model):
+class ContactPerson(LoadedValuesMixin, models.Model):
     """Database model for contact people"""
     name = models.CharField(max_length=30)
     surname = models.CharField(max_length=40)
@@ -44,6 +137,110 @@ class ContactPerson(models.Model):
     company = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     is_deleted = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ContactPersonQuerySet.as_manager()
+    live = LiveManager.from_queryset(ContactPersonQuerySet)()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'id'], condition=Q(is_deleted=False), name='crm_contact_company_live_idx'),
+            models.Index(fields=['updated_at'], condition=Q(is_deleted=True), name='crm_contact_deleted_idx'),
+            models.Index(fields=['company', 'updated_at'], name='crm_contact_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name + ' ' + self.surname
+
+
+class ChangeLog(models.Model):
+    """Append-only record of who changed which fields of audited row"""
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTIONS = ((CREATE, 'Create'), (UPDATE, 'Update'), (DELETE, 'Delete'))
+
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    model = models.CharField(max_length=40)
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(max_length=6, choices=ACTIONS)
+    changes = models.JSONField(encoder=DjangoJSONEncoder, default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'object_id'], name='crm_changelog_object_idx'),
+        ]
+
+    def __str__(self):
+        return '%s %s %s' % (self.action, self.model, self.object_id)
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError('Change log entries can not be changed')
+        super().save(*args, **kwargs)
+
+
+class ReportRow(models.Model):
+    """Live companies of one industry, city or owner with their contacts and notes, maintained by CRM.reports"""
+    INDUSTRY = 'industry'
+    CITY = 'city'
+    USER = 'user'
+    DIMENSIONS = ((INDUSTRY, 'Industry'), (CITY, 'City'), (USER, 'Owner'))
+
+    dimension = models.CharField(max_length=8, choices=DIMENSIONS)
+    # Industry or user id or city name, empty for companies without industry or owner
+    key = models.CharField(max_length=40, blank=True)
+    companies = models.PositiveIntegerField(default=0)
+    contacts = models.PositiveIntegerField(default=0)
+    notes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], name='crm_reportrow_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['dimension', '-companies', 'key'], name='crm_reportrow_top_idx'),
+        ]
+
+    def __str__(self):
+        return '%s %s' % (self.dimension, self.key)
+
+
+class ArchivedRow(models.Model):
+    """Soft deleted row moved out of its table, stored with root row whose archival moved it"""
+    model = models.CharField(max_length=40)
+    object_id = models.PositiveIntegerField()
+    root_model = models.CharField(max_length=40)
+    root_id = models.PositiveIntegerField()
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'object_id'], name='crm_archivedrow_object_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['root_model', 'root_id'], name='crm_archivedrow_root_idx'),
+        ]
+
+    def __str__(self):
+        return '%s %s' % (self.model, self.object_id)
+
+
+class SyncChange(models.Model):
+    """Latest change of synced row, primary key orders changes and is the token clients sync from
+
+    Row of changed object is replaced by new one, so clients fetch each object once however often it changed.
+    AUTOINCREMENT primary keys are never reused and SQLite serializes writers, tokens only grow in commit order.
+    """
+    model = models.CharField(max_length=40)
+    object_id = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'object_id'], name='crm_syncchange_object_uniq'),
+        ]
+
+    def __str__(self):
+        return '%s %s %s' % (self.pk, self.model, self.object_id)
@@ -0,0 +1,230 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from CRM.models import Company, ContactPerson, Note, ReportRow
+from ProgrammingWorkshop.managers import updated_values
+from ProgrammingWorkshop.signals import rows_updated
+
+# Company field each report dimension groups by
+DIMENSIONS = {ReportRow.INDUSTRY: 'industry', ReportRow.CITY: 'city', ReportRow.USER: 'user'}
+# Report total each related model is counted in
+RELATED_TOTALS = {Note: 'notes', ContactPerson: 'contacts'}
+
+
+def attname(dimension):
+    return Company._meta.get_field(DIMENSIONS[dimension]).attname
+
+
+def report_key(value):
+    return '' if value is None else str(value)
+
+
+def company_keys(values):
+    """Report keys per dimension of company given by instance or by dict of attribute values"""
+    get = values.get if isinstance(values, dict) else lambda name: getattr(values, name)
+    return {dimension: report_key(get(attname(dimension))) for dimension in DIMENSIONS}
+
+
+def summarize(dimension, companies):
+    """Map report keys of dimension to totals of live companies among given ones, one GROUP BY query"""
+    field = attname(dimension)
+    rows = companies.filter(is_deleted=False).order_by().values(field).annotate(
+        companies=Count('pk'), contacts=Coalesce(Sum('contact_count'), 0), notes=Coalesce(Sum('note_count'), 0)
+    )
+    return {report_key(row.pop(field)): row for row in rows}
+
+
+def companies_with(dimension, keys):
+    """Companies under given report keys of dimension, empty key of industry and owner means none"""
+    field = attname(dimension)
+    condition = Q(**{field + '__in': [key for key in keys if key]})
+    if '' in keys:
+        condition |= Q(city='') if field == 'city' else Q(**{field + '__isnull': True})
+    return Company.objects.filter(condition)
+
+
+def add(deltas):
+    """Add deltas keyed by dimension and key to report rows, creating missing rows and removing emptied ones"""
+    emptied = Q()
+    for (dimension, key), delta in deltas.items():
+        delta = {total: value for total, value in delta.items() if value}
+        if not delta:
+            continue
+        if not ReportRow.objects.filter(dimension=dimension, key=key).update(
+                **{total: F(total) + value for total, value in delta.items()}):
+            ReportRow.objects.bulk_create([ReportRow(dimension=dimension, key=key, **delta)], ignore_conflicts=True)
+        if delta.get('companies', 0) < 0:
+            emptied |= Q(dimension=dimension, key=key)
+    if emptied:
+        ReportRow.objects.filter(emptied, companies=0).delete()
+
+
+def refresh(dimension, keys):
+    """Recompute report rows of keys from live companies, rows left without companies are removed"""
+    keys = set(keys)
+    if not keys:
+        return
+    totals = summarize(dimension, companies_with(dimension, keys))
+    missing = [ReportRow(dimension=dimension, key=key, **values) for key, values in totals.items()
+               if not ReportRow.objects.filter(dimension=dimension, key=key).update(**values)]
+    ReportRow.objects.bulk_create(missing, ignore_conflicts=True)
+    if keys - set(totals):
+        ReportRow.objects.filter(dimension=dimension, key__in=keys - set(totals)).delete()
+
+
+def refresh_companies(companies, dimensions=tuple(DIMENSIONS)):
+    """Recompute report rows which given company instances or dicts of company attribute values count in"""
+    keys = [company_keys(company) for company in companies]
+    for dimension in dimensions:
+        refresh(dimension, {company[dimension] for company in keys})
+
+
+def refresh_company_ids(pks):
+    """Recompute report rows which companies of given ids count in"""
+    refresh_companies(Company.objects.filter(pk__in=pks).values(*map(attname, DIMENSIONS)))
+
+
+def rebuild(dimensions=tuple(DIMENSIONS)):
+    """Replace report rows of dimensions with totals grouped over all companies
+
+    Old rows are deleted first, on SQLite the transaction then holds write lock while it groups companies, so it
+    neither misses concurrent writes nor fails upgrading a stale read snapshot.
+    """
+    for dimension in dimensions:
+        with transaction.atomic():
+            ReportRow.objects.filter(dimension=dimension).delete()
+            totals = summarize(dimension, Company.objects.all())
+            ReportRow.objects.bulk_create(ReportRow(dimension=dimension, key=key, **values)
+                                          for key, values in totals.items())
+
+
+def drifted(dimension):
+    """Report keys of dimension whose stored totals differ from live companies"""
+    stored = {row.pop('key'): row for row in ReportRow.objects.filter(dimension=dimension)
+              .values('key', 'companies', 'contacts', 'notes')}
+    actual = summarize(dimension, Company.objects.all())
+    return {key for key in stored.keys() | actual.keys() if stored.get(key) != actual.get(key)}
+
+
+def previous_values(instance, created):
+    """Attribute values saved instance had before save, empty for new instances"""
+    if created:
+        return {}
+    changed = instance.changed_values()
+    return {name: changed[name][0] if name in changed else value for name, value in instance.field_values().items()}
+
+
+def contribution(values):
+    """Totals which company given by attribute values adds to its report rows, nothing unless it is live"""
+    if values.get('is_deleted') is not False:
+        return {}
+    return {'companies': 1, 'contacts': values['contact_count'], 'notes': values['note_count']}
+
+
+def add_company(deltas, values, sign):
+    for key in company_keys(values).items():
+        delta = deltas.setdefault(key, Counter())
+        for total, value in contribution(values).items():
+            delta[total] += sign * value
+
+
+def count_companies(companies):
+    """Count company instances inserted without save() into report rows"""
+    deltas = {}
+    for company in companies:
+        add_company(deltas, company.field_values(), 1)
+    add(deltas)
+
+
+def count_related(sender, changes):
+    """Add changes of note or contact person counts keyed by company id to report rows of live companies"""
+    changes = {pk: change for pk, change in changes.items() if pk is not None and change}
+    if not changes:
+        return
+    total = RELATED_TOTALS[sender]
+    deltas = {}
+    for company in Company.live.filter(pk__in=changes).values('id', *map(attname, DIMENSIONS)):
+        for key in company_keys(company).items():
+            deltas.setdefault(key, Counter())[total] += changes[company['id']]
+    add(deltas)
+
+
+@receiver(post_save, sender=Company)
+def company_saved(sender, instance, created, **kwargs):
+    """Move totals of company from report rows of its previous values to rows of current ones
+
+    Counts loaded with edited company may be stale, current ones are read when company moves between rows.
+    """
+    previous = previous_values(instance, created)
+    current = instance.field_values()
+    if previous == current:
+        return
+    if previous and any(previous.get(name) != current.get(name) for name in (*map(attname, DIMENSIONS), 'is_deleted')):
+        counts = Company.objects.filter(pk=instance.pk).values('contact_count', 'note_count').get()
+        previous.update(counts)
+        current.update(counts)
+    deltas = {}
+    add_company(deltas, previous, -1)
+    add_company(deltas, current, 1)
+    add(deltas)
+
+
+@receiver(post_delete, sender=Company)
+def company_deleted(sender, instance, **kwargs):
+    deltas = {}
+    add_company(deltas, instance.field_values(), -1)
+    add(deltas)
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_save, sender=ContactPerson)
+def related_saved(sender, instance, created, **kwargs):
+    """Count note or contact person out of company it was counted in and into its current one"""
+    previous = previous_values(instance, created)
+    changes = Counter()
+    if previous.get('is_deleted') is False:
+        changes[previous['company_id']] -= 1
+    if not instance.is_deleted:
+        changes[instance.company_id] += 1
+    count_related(sender, changes)
+
+
+@receiver(post_delete, sender=Note)
+@receiver(post_delete, sender=ContactPerson)
+def related_deleted(sender, instance, **kwargs):
+    if not instance.is_deleted:
+        count_related(sender, {instance.company_id: -1})
+
+
+def moved_related(previous, current):
+    """Changes of note or contact person counts keyed by company id after bulk update of given rows"""
+    changes = Counter()
+    for pk, row in previous.items():
+        if not row['is_deleted']:
+            changes[row['company_id']] -= 1
+        if not current[pk]['is_deleted']:
+            changes[current[pk]['company_id']] += 1
+    return changes
+
+
+@receiver(rows_updated)
+def rows_changed(sender, pks, fields, values=None, previous=None, **kwargs):
+    """Move totals of bulk updated companies, notes and contact people from their previous report rows to current ones
+
+    Notes and contact people are counted by their companies, so bulk updates of stored company counts alone are left
+    out.
+    """
+    if sender is Company and fields & {*DIMENSIONS.values(), 'is_deleted'}:
+        current = updated_values(sender, previous, values)
+        deltas = {}
+        for pk, row in previous.items():
+            add_company(deltas, row, -1)
+            add_company(deltas, current[pk], 1)
+        add(deltas)
+    elif sender in RELATED_TOTALS and fields & {'is_deleted', 'company'}:
+        count_related(sender, moved_related(previous, updated_values(sender, previous, values)))
@@ -0,0 +1,70 @@
+from django.db import connection
+from django.db.models import Q
+
+from CRM.models import ContactPerson
+
+# Hard limit of ranked results, pages are cut from these ids only
+SEARCH_RESULT_CAP = 200
+TRIGRAM = 3
+# Part of query trigrams a contact has to contain to be listed as similar
+SIMILARITY = 0.5
+
+
+def quote(term):
+    """Quote term as FTS5 string so user input is never parsed as query syntax"""
+    return '"%s"' % term.replace('"', '""')
+
+
+def trigrams(term):
+    return {term[i:i + TRIGRAM] for i in range(len(term) - TRIGRAM + 1)}
+
+
+def match(expression, limit):
+    """Return rows of contact people matching FTS5 expression ranked best first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid, name, surname, mail, phone, company FROM CRM_contactperson_fts '
+            'WHERE CRM_contactperson_fts MATCH %s ORDER BY rank LIMIT %s',
+            [expression, limit]
+        )
+        return cursor.fetchall()
+
+
+def similar_ids(terms, exclude, limit):
+    """Return ids of contact people sharing most trigrams with terms, tolerating typos"""
+    wanted = set().union(*(trigrams(term) for term in terms))
+    rows = match(' OR '.join(quote(trigram) for trigram in sorted(wanted)), limit + len(exclude))
+    ids = []
+    for row in rows:
+        text = ' '.join(value or '' for value in row[1:]).lower()
+        if row[0] not in exclude and sum(trigram in text for trigram in wanted) >= SIMILARITY * len(wanted):
+            ids.append(row[0])
+    return ids[:limit]
+
+
+def prefix_ids(terms, limit):
+    """Return ids of contact people with every term prefixing one of searched fields"""
+    people = ContactPerson.live.all()
+    for term in terms:
+        people = people.filter(
+            Q(name__istartswith=term) | Q(surname__istartswith=term) | Q(mail__istartswith=term) |
+            Q(phone__startswith=term) | Q(company__name__istartswith=term)
+        )
+    return list(people.order_by('surname', 'name', 'id').values_list('id', flat=True)[:limit])
+
+
+def search_contacts(query, limit=SEARCH_RESULT_CAP):
+    """Return ids of live contact people matching query, best matches first
+
+    Every term has to appear in name, surname, mail, phone or company name. When that finds less than limit,
+    people sharing trigrams with the terms follow, which tolerates typos.
+    """
+    terms = query.lower().split()
+    if not terms:
+        return []
+    if connection.vendor != 'sqlite' or any(len(term) < TRIGRAM for term in terms):
+        return prefix_ids(terms, limit)
+    ids = [row[0] for row in match(' '.join(quote(term) for term in terms), limit)]
+    if len(ids) < limit:
+        ids += similar_ids(terms, set(ids), limit - len(ids))
+    return ids
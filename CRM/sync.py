@@ -0,0 +1,78 @@
+from django.db import connections, router, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from CRM.models import Company, ContactPerson, Note, SyncChange
+from ProgrammingWorkshop.signals import rows_updated
+
+SYNCED = (Company, ContactPerson, Note)
+MODELS = {model._meta.label_lower: model for model in SYNCED}
+BATCH_SIZE = 500
+
+
+def replace(connection, label, pks):
+    """Move rows to the end of sequence on SQLite, REPLACE deletes old row of object and inserts one with next
+    AUTOINCREMENT key in single statement
+    """
+    sql = 'INSERT OR REPLACE INTO %s (model, object_id) VALUES ' % connection.ops.quote_name(SyncChange._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), BATCH_SIZE):
+            batch = pks[start:start + BATCH_SIZE]
+            cursor.execute(sql + ', '.join(['(%s, %s)'] * len(batch)), [item for pk in batch for item in (label, pk)])
+
+
+def touch(model, pks):
+    """Move rows of model to the end of change sequence"""
+    pks = sorted({pk for pk in pks if pk is not None})
+    if not pks:
+        return
+    label = model._meta.label_lower
+    connection = connections[router.db_for_write(SyncChange)]
+    if connection.vendor == 'sqlite':
+        replace(connection, label, pks)
+        return
+    with transaction.atomic(using=connection.alias):
+        SyncChange.objects.filter(model=label, object_id__in=pks).delete()
+        SyncChange.objects.bulk_create(SyncChange(model=label, object_id=pk) for pk in pks)
+
+
+def touch_inserted(model, last_pk):
+    """Move rows inserted by bulk_create after row last_pk to the end of change sequence"""
+    touch(model, model.objects.filter(pk__gt=last_pk or 0).values_list('pk', flat=True))
+
+
+def register_missing():
+    """Add rows which are not in change sequence yet, for rows inserted without signals"""
+    for label, model in MODELS.items():
+        registered = SyncChange.objects.filter(model=label).values('object_id')
+        pks = model.objects.exclude(pk__in=registered).order_by('pk').values_list('pk', flat=True).iterator()
+        SyncChange.objects.bulk_create((SyncChange(model=label, object_id=pk) for pk in pks), batch_size=1000)
+
+
+def changes_since(token, limit):
+    """Return changes after token as (change, object) pairs, object is None for rows deleted from their table
+
+    One query reads the sequence and one per synced model loads changed rows, deleted ones included.
+    """
+    changes = list(SyncChange.objects.filter(pk__gt=token).order_by('pk')[:limit])
+    pks = {}
+    for change in changes:
+        pks.setdefault(change.model, []).append(change.object_id)
+    objects = {label: MODELS[label].objects.in_bulk(ids) for label, ids in pks.items()}
+    return [(change, objects[change.model].get(change.object_id)) for change in changes]
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=ContactPerson)
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=ContactPerson)
+@receiver(post_delete, sender=Note)
+def row_changed(sender, instance, **kwargs):
+    touch(sender, [instance.pk])
+
+
+@receiver(rows_updated)
+def rows_changed(sender, pks, **kwargs):
+    if sender in SYNCED:
+        touch(sender, pks)
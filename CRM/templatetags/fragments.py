@@ -0,0 +1,39 @@
+from django import template
+from django.conf import settings
+
+from CRM.fragments import fragment_key, fragment_stats, get_cache
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, obj):
+        self.nodelist = nodelist
+        self.name = name
+        self.obj = obj
+
+    def render(self, context):
+        cache = get_cache()
+        key = fragment_key(self.name.resolve(context), self.obj.resolve(context))
+        content = cache.get(key)
+        if content is not None:
+            fragment_stats.hit()
+            return content
+        fragment_stats.miss()
+        content = self.nodelist.render(context)
+        cache.set(key, content, getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 3600))
+        return content
+
+
+@register.tag
+def fragment(parser, token):
+    """Cache block rendered for object until object or data shown with it changes
+
+    Usage: {% fragment 'name' object %} ... {% endfragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError("'%s' tag requires fragment name and object" % bits[0])
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
@@ -1,3 +1,905 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, router
+from django.http import HttpResponse
+from django.template import engines
+from django.test import TestCase, AsyncClient, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from CRM.audit import ChangeLogWriter
+from CRM.fragments import fragment_stats, get_cache
+from CRM.models import ArchivedRow, ChangeLog, Company, Industry, Note, ContactPerson, ReportRow, industries
+from CRM.reports import DIMENSIONS, drifted
+from CRM.search import search_contacts
+from ProgrammingWorkshop.db import ReadRoutingMiddleware, apply_pragmas
+from ProgrammingWorkshop.middleware import query_stats
+from ProgrammingWorkshop.testing import QueryBudgetTestMixin
+from users.models import User, Role
+
+
+class CompanyListTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(login='tester', name='Test', surname='User', date_of_birth='2000-01-01',
+                                       role_id=Role.objects.create(role_name='regular user'))
+        cls.industry = Industry.objects.create(name='IT')
+        for i in range(25):
+            Company.objects.create(name='Company %d' % i, nip='%010d' % i, address='Street', city='City',
+                                   industry=cls.industry if i % 2 else None, is_deleted=i == 3)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_keyset_pages(self):
+        first = self.client.get(reverse('CRM:index'))
+        page = first.context['company_list']
+        self.assertEqual(len(page), 10)
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+        self.assertNotIn('%010d' % 3, [company.nip for company in page])
+        second = self.client.get(reverse('CRM:index') + '?' + page.next_query()).context['company_list']
+        self.assertEqual(second[0].pk, page[9].pk + 1)
+        self.assertTrue(second.has_previous())
+        back = self.client.get(reverse('CRM:index') + '?' + second.previous_query()).context['company_list']
+        self.assertEqual([company.pk for company in back], [company.pk for company in page])
+        self.assertFalse(back.has_previous())
+
+    def test_keyset_pages_with_filter(self):
+        url = reverse('CRM:index') + '?filter=%d' % self.industry.id
+        page = self.client.get(url).context['company_list']
+        self.assertTrue(all(company.industry_id == self.industry.id for company in page))
+        self.assertIn('filter=%d' % self.industry.id, page.next_query())
+        last = self.client.get(reverse('CRM:index') + '?' + page.next_query()).context['company_list']
+        self.assertEqual(len(last), 1)
+        self.assertFalse(last.has_next())
+
+
+class QueryBudgetTest(QueryBudgetTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(role_name='regular user')
+        cls.user = User.objects.create(login='tester', name='Test', surname='User', date_of_birth='2000-01-01',
+                                       role_id=role)
+        cls.company = Company.objects.create(name='Company', nip='0000000001', address='Street', city='City',
+                                             industry=Industry.objects.create(name='IT'), user=cls.user)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def add_rows(self, count=3):
+        """Add rows written by different authors"""
+        start = User.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create(login='author%d' % i, name='Author', surname='Smith',
+                                         date_of_birth='2000-01-01', role_id=self.user.role_id)
+            industry = Industry.objects.create(name='Industry %d' % i)
+            Company.objects.create(name='Company', nip='1%09d' % i, address='Street', city='City',
+                                   industry=industry, user=author)
+            Note.objects.create(content='Note', company=self.company, user=author)
+            ContactPerson.objects.create(name='John', surname='Smith', phone='123456789', mail='john@example.com',
+                                         company=self.company, user=author)
+
+    def urls(self):
+        return [reverse('CRM:index'), reverse('CRM:detail', args=[self.company.id]),
+                reverse('CRM:detail_notes', args=[self.company.id]) + '?after=1000',
+                reverse('CRM:search') + '?search=Smith']
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.assertQueryCountConstant(self.urls(), self.add_rows)
+
+    def test_within_query_budget(self):
+        self.add_rows()
+        for url in self.urls():
+            self.assertWithinQueryBudget(url)
+
+    def test_detail_changes_read_from_indexes(self):
+        self.add_rows()
+        with CaptureQueriesContext(connection) as context:
+            Company.objects.detail_changes(self.company.pk)
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + context.captured_queries[0]['sql'])
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('crm_note_updated_idx', plan)
+        self.assertIn('crm_contact_updated_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_stats_recorded_per_url_name(self):
+        query_stats.reset()
+        self.client.get(reverse('CRM:detail', args=[self.company.id]))
+        stats = query_stats.snapshot()['CRM:detail']
+        self.assertEqual(stats['requests'], 1)
+        self.assertGreater(stats['queries'], 0)
+        self.assertEqual(stats['over_budget'], 0)
+
+
+class SearchContactsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name='Acme', nip='0000000001', address='Street', city='City')
+        cls.kowalski = ContactPerson.objects.create(name='Jan', surname='Kowalski', phone='600100200',
+                                                    mail='jan@acme.pl', company=cls.company)
+        cls.nowak = ContactPerson.objects.create(name='Anna', surname='Nowak', phone='600300400',
+                                                 mail='anna@other.pl', company=cls.company)
+
+    def test_substring_and_company(self):
+        self.assertEqual(search_contacts('kowal'), [self.kowalski.id])
+        self.assertEqual(search_contacts('anna nowak'), [self.nowak.id])
+        self.assertEqual(set(search_contacts('acme')), {self.kowalski.id, self.nowak.id})
+        self.assertEqual(search_contacts('no'), [self.nowak.id])
+
+    def test_typo_ranked_after_matches(self):
+        self.assertEqual(search_contacts('kowalsky')[0], self.kowalski.id)
+
+    def test_index_follows_changes(self):
+        self.kowalski.surname = 'Lewandowski'
+        self.kowalski.save()
+        self.assertEqual(search_contacts('lewandow'), [self.kowalski.id])
+        self.company.name = 'Globex'
+        self.company.save()
+        self.assertEqual(set(search_contacts('globex')), {self.kowalski.id, self.nowak.id})
+        self.nowak.is_deleted = True
+        self.nowak.save()
+        self.assertEqual(search_contacts('globex'), [self.kowalski.id])
+
+    def test_results_are_capped(self):
+        ContactPerson.objects.bulk_create(
+            ContactPerson(name='Jan', surname='Smith', phone='600100200', mail='smith@acme.pl', company=self.company)
+            for _ in range(30)
+        )
+        self.assertEqual(len(search_contacts('smith', limit=25)), 25)
+        self.assertEqual(len(search_contacts('sm', limit=10)), 10)
+        self.assertEqual(len(search_contacts('jan', limit=5)), 5)
+
+
+class LiveManagerTest(TestCase):
+
+    def test_live_and_all_rows(self):
+        live = Company.objects.create(name='Live', nip='0000000001', address='Street', city='City')
+        deleted = Company.objects.create(name='Deleted', nip='0000000002', address='Street', city='City',
+                                         is_deleted=True)
+        self.assertEqual(list(Company.live.all()), [live])
+        self.assertEqual(list(Company.objects.deleted()), [deleted])
+        self.assertEqual(Company.objects.count(), 2)
+        Note.objects.create(content='Note', company=live, is_deleted=True)
+        self.assertFalse(Note.live.filter(company=live).exists())
+
+
+class ImportCommandTest(TestCase):
+
+    def import_file(self, content, suffix, **options):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        errors = StringIO()
+        call_command('import_crm', file.name, stdout=StringIO(), stderr=errors, **options)
+        return errors.getvalue()
+
+    def test_companies_upserted_by_nip(self):
+        Industry.objects.create(name='IT')
+        Company.objects.create(name='Old', nip='0000000001', address='Street', city='City')
+        errors = self.import_file(
+            'name,nip,industry,address,city\n'
+            'Acme,0000000001,it,Main 1,Poznan\n'
+            'Globex,0000000002,,Main 2,Warsaw\n'
+            'Bad,0000000003,Unknown,Main 3,Gdansk\n'
+            ',0000000004,,Main 4,Gdansk\n',
+            '.csv', model='company', batch_size=2
+        )
+        self.assertEqual(Company.objects.count(), 2)
+        acme = Company.objects.get(nip='0000000001')
+        self.assertEqual((acme.name, acme.industry.name, acme.city), ('Acme', 'IT', 'Poznan'))
+        self.assertEqual(len(errors.splitlines()), 2)
+        self.assertIn('Unknown industry', errors)
+
+    def test_duplicate_nips_rejected_and_deleted_company_restored(self):
+        Company.objects.create(name='Old', nip='0000000001', address='Street', city='City', is_deleted=True)
+        errors = self.import_file(
+            'name,nip,industry,address,city\n'
+            'First,0000000002,,Main 1,Poznan\n'
+            'Acme,0000000001,,Main 1,Poznan\n'
+            'Second,0000000002,,Main 2,Warsaw\n',
+            '.csv', model='company'
+        )
+        self.assertEqual(list(Company.live.order_by('nip').values_list('name', flat=True)), ['Acme', 'Second'])
+        self.assertEqual(json.loads(errors)['row'], 1)
+        self.assertIn('Duplicate nip', errors)
+        self.assertEqual(ReportRow.objects.get(dimension='city', key='Poznan').companies, 1)
+
+    def test_contacts_and_notes_reference_company_nip(self):
+        company = Company.objects.create(name='Acme', nip='0000000001', address='Street', city='City')
+        errors = self.import_file(
+            '{"company": "0000000001", "name": "Jan", "surname": "Kowalski", "phone": "600100200", '
+            '"mail": "jan@acme.pl"}\n'
+            '{"company": "0000000009", "name": "Anna", "surname": "Nowak", "phone": "600100200", '
+            '"mail": "anna@acme.pl"}\n'
+            'not json\n',
+            '.jsonl', model='contact'
+        )
+        self.assertEqual(list(company.contactperson_set.values_list('surname', flat=True)), ['Kowalski'])
+        self.assertEqual(len(errors.splitlines()), 2)
+        self.import_file('{"company": "0000000001", "content": "Imported"}\n', '.jsonl', model='note')
+        self.assertEqual(company.note_set.get().content, 'Imported')
+
+
+class ExportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(login='tester', name='Test', surname='User', date_of_birth='2000-01-01',
+                                       role_id=Role.objects.create(role_name='regular user'))
+        it = Industry.objects.create(name='IT')
+        for i in range(5):
+            company = Company.objects.create(name='Company %d' % i, nip='%010d' % i, address='Street', city='City',
+                                             industry=it if i % 2 else None, user=cls.user)
+            Note.objects.create(content='Note %d' % i, company=company, user=cls.user)
+            Note.objects.create(content='Deleted', company=company, is_deleted=True)
+        cls.industry = it
+
+    def test_streamed_jsonl_with_filter(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('CRM:export') + '?format=jsonl&filter=%d' % self.industry.id)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['nip'] for row in rows], ['%010d' % 1, '%010d' % 3])
+        self.assertEqual(rows[0]['notes'], [{'content': 'Note 1', 'user': 'tester'}])
+
+    def test_command_exports_csv(self):
+        output = StringIO()
+        call_command('export_crm', stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 1 + 5 * 2)
+        self.assertTrue(lines[-1].startswith('note,%010d' % 4))
+
+    def test_export_rejects_non_numeric_filters(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('CRM:export') + '?filter=it').status_code, 400)
+        self.assertEqual(self.client.get(reverse('CRM:export') + '?format=jsonl&user=x').status_code, 400)
+
+    def test_export_requires_login(self):
+        self.assertEqual(self.client.get(reverse('CRM:export')).status_code, 302)
+
+
+class BulkUpdateTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(login='tester', name='Test', surname='User', date_of_birth='2000-01-01',
+                                       role_id=Role.objects.create(role_name='regular user'))
+        cls.companies = [
+            Company.objects.create(name='Company %d' % i, nip='%010d' % i, address='Street', city='City')
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post(self, data):
+        return self.client.post(reverse('CRM:bulk_company'), json.dumps(data), content_type='application/json')
+
+    def test_bulk_soft_delete(self):
+        ids = [company.id for company in self.companies[:3]]
+        # Selecting rows with their values, update, change log insert, three report row deltas, check for emptied
+        # report rows and moving rows to the end of sync sequence, companies without industry recount none
+        with self.assertNumQueries(9):
+            response = self.post({'ids': ids + [999], 'action': 'delete'})
+        self.assertEqual(response.json()['updated'], ids)
+        self.assertEqual(response.json()['skipped'], [999])
+        self.assertEqual(list(Company.live.all()), [self.companies[3]])
+
+    def test_bulk_update_validated_by_form(self):
+        industry = Industry.objects.create(name='IT')
+        response = self.post({'ids': [self.companies[0].id], 'values': {'industry': industry.id}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Company.objects.get(pk=self.companies[0].id).industry, industry)
+        self.assertEqual(self.post({'ids': [self.companies[0].id], 'values': {'industry': 999}}).status_code, 400)
+        self.assertEqual(self.post({'ids': [self.companies[0].id], 'values': {'nip': '1'}}).status_code, 400)
+        self.assertEqual(self.post({'ids': 'x'}).status_code, 400)
+
+
+class FragmentCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(login='tester', name='Test', surname='User', date_of_birth='2000-01-01',
+                                       role_id=Role.objects.create(role_name='regular user'))
+        cls.industry = Industry.objects.create(name='IT')
+        cls.company = Company.objects.create(name='Acme', nip='0000000001', address='Street', city='City',
+                                             industry=cls.industry)
+
+    def setUp(self):
+        get_cache().clear()
+        fragment_stats.reset()
+        self.client.force_login(self.user)
+
+    def test_card_cached_until_saved(self):
+        self.client.get(reverse('CRM:index'))
+        self.assertContains(self.client.get(reverse('CRM:index')), 'Acme')
+        self.assertEqual(fragment_stats.snapshot()['hits'], 1)
+        self.company.name = 'Globex'
+        self.company.save()
+        self.assertContains(self.client.get(reverse('CRM:index')), 'Globex')
+        self.assertEqual(fragment_stats.snapshot()['misses'], 2)
+
+    def test_related_and_bulk_changes_invalidate(self):
+        self.client.get(reverse('CRM:detail', args=[self.company.id]))
+        self.industry.name = 'Software'
+        self.industry.save()
+        self.assertContains(self.client.get(reverse('CRM:detail', args=[self.company.id])), 'Software')
+        Company.objects.filter(pk=self.company.pk).update_rows(city='Poznan')
+        self.assertContains(self.client.get(reverse('CRM:detail', args=[self.company.id])), 'Poznan')
+        self.assertEqual(fragment_stats.snapshot()['hits'], 0)
+
+    def test_writes_of_other_process_invalidate(self):
+        self.client.get(reverse('CRM:index'))
+        # Own cache connection, like worker or management command running in another process
+        other = caches.create_connection(settings.FRAGMENT_CACHE)
+        with mock.patch('CRM.fragments.get_cache', return_value=other):
+            Company.objects.filter(pk=self.company.pk).update_rows(name='Globex')
+        self.assertContains(self.client.get(reverse('CRM:index')), 'Globex')
+        self.assertEqual(fragment_stats.snapshot()['hits'], 0)
+
+
+class ReferenceCacheTest(TestCase):
+
+    def test_industries_reloaded_after_write(self):
+        it = Industry.objects.create(name='IT')
+        self.assertEqual(industries.all(), [it])
+        with self.assertNumQueries(0):
+            self.assertEqual(industries.get(it.pk).name, 'IT')
+        it.name = 'Software'
+        it.save()
+        self.assertEqual(industries.get(it.pk).name, 'Software')
+        it.delete()
+        self.assertIsNone(industries.get(it.pk))
+
+
+@override_settings(ASYNC_CONCURRENT_QUERIES=False)
+class AsyncViewsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(login='tester', name='Test', surname='User', date_of_birth='2000-01-01',
+                                       role_id=Role.objects.create(role_name='regular user'))
+        cls.company = Company.objects.create(name='Acme', nip='0000000001', address='Street', city='City')
+        Note.objects.create(content='First note', company=cls.company, user=cls.user)
+        cls.person = ContactPerson.objects.create(name='Jan', surname='Kowalski', phone='600100200',
+                                                  mail='jan@acme.pl', company=cls.company)
+
+    def setUp(self):
+        self.async_client.force_login(self.user)
+
+    async def test_async_pages_match_sync_pages(self):
+        detail = await self.async_client.get(reverse('CRM:async_detail', args=[self.company.id]))
+        self.assertContains(detail, 'First note')
+        self.assertContains(detail, 'Kowalski')
+        self.assertContains(await self.async_client.get(reverse('CRM:async_index')), 'Acme')
+        search = await self.async_client.get(reverse('CRM:async_search') + '?search=kowalski')
+        self.assertEqual([person.pk for person in search.context['people']], [self.person.pk])
+
+    async def test_async_login_required(self):
+        response = await AsyncClient().get(reverse('CRM:async_index'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('redirect=', response.url)
+
+
+@override_settings(ASYNC_CONCURRENT_QUERIES=False)
+class SeedAndBenchmarkTest(TestCase):
+
+    def test_seed_numbering_skips_existing_nips(self):
+        existing = Company.objects.create(name='Real', nip='0000000003', address='Street', city='City')
+        call_command('seed_crm', companies=3, users=1, stdout=StringIO())
+        self.assertEqual(Company.objects.count(), 4)
+        self.assertEqual(Company.objects.order_by('-nip').values_list('nip', flat=True)[0], '0000000006')
+        self.assertFalse(existing.note_set.exists())
+
+    def test_seeded_rows_benchmarked(self):
+        call_command('seed_crm', companies=20, contacts_per_company=2, notes_per_company=3, users=3, deleted=0,
+                     batch_size=8, stdout=StringIO())
+        self.assertEqual(Company.objects.count(), 20)
+        self.assertEqual(ContactPerson.objects.count(), 40)
+        self.assertEqual(Note.objects.count(), 60)
+        self.assertEqual(User.objects.filter(login__startswith='seed').count(), 3)
+        call_command('seed_crm', companies=5, users=1, stdout=StringIO())
+        self.assertEqual(Company.objects.count(), 25)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('bench_urls', login='seed0', requests=2, warmup=0, output=output, stdout=StringIO())
+            with open(output, encoding='utf-8') as file:
+                results = json.load(file)['urls']
+        self.assertIn('CRM:index', results)
+        self.assertIn('users:password', results)
+        self.assertNotIn('CRM:export', results)
+        self.assertEqual(results['CRM:index']['requests'], 2)
+        self.assertGreater(results['CRM:index']['queries'], 0)
+
+
+class DatabaseProfileTest(TestCase):
+
+    @override_settings(READ_DATABASE='read')
+    def test_read_only_views_routed_to_read_database(self):
+        routed = []
+
+        def get_response(request):
+            routed.append(router.db_for_read(Company))
+            return HttpResponse()
+
+        middleware = ReadRoutingMiddleware(get_response)
+        factory = RequestFactory()
+        middleware(factory.get(reverse('CRM:index')))
+        middleware(factory.post(reverse('CRM:index')))
+        middleware(factory.get(reverse('CRM:add_company')))
+        self.assertEqual(routed, ['read', 'default', 'default'])
+        self.assertEqual(router.db_for_read(Company), 'default')
+        self.assertEqual(router.db_for_write(Company), 'default')
+
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -1000})
+    def test_pragmas_applied_on_connect(self):
+        apply_pragmas(sender=type(connection), connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -1000)
+
+
+class ConditionalGetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(login='tester', name='Test', surname='User', date_of_birth='2000-01-01',
+                                       role_id=Role.objects.create(role_name='regular user'))
+        cls.company = Company.objects.create(name='Acme', nip='0000000001', address='Street', city='City')
+        cls.person = ContactPerson.objects.create(name='Jan', surname='Kowalski', phone='600100200',
+                                                  mail='jan@acme.pl', company=cls.company)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertNotModified(self, url):
+        self.client.get(url)
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.templates, [])
+        return etag
+
+    def test_index_not_modified_until_company_changes(self):
+        url = reverse('CRM:index')
+        etag = self.assertNotModified(url)
+        Company.objects.filter(pk=self.company.pk).update_rows(city='Town')
+        etag = self.client.get(url, HTTP_IF_NONE_MATCH=etag)['ETag']
+        Industry.objects.create(name='IT')
+        self.assertContains(self.client.get(url, HTTP_IF_NONE_MATCH=etag), 'IT')
+
+    def test_detail_etag_follows_notes_and_contacts(self):
+        url = reverse('CRM:detail', args=[self.company.id])
+        etag = self.assertNotModified(url)
+        Note.objects.create(content='New note', company=self.company)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'New note')
+        etag = response['ETag']
+        before = ContactPerson.objects.get(pk=self.person.pk).updated_at
+        ContactPerson.objects.filter(pk=self.person.pk).soft_delete()
+        self.assertGreater(ContactPerson.objects.get(pk=self.person.pk).updated_at, before)
+        self.assertNotContains(self.client.get(url, HTTP_IF_NONE_MATCH=etag), 'Kowalski')
+
+
+class StaticPipelineTest(TestCase):
+
+    def test_hashed_files_served_compressed_and_immutable(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            STATIC_ROOT=directory, STATICFILES_STORAGE='ProgrammingWorkshop.static.CompressedManifestStaticFilesStorage'
+        ):
+            # Pipeline degrades to gzip without brotli, collectstatic says so
+            with mock.patch.dict('ProgrammingWorkshop.static.OPTIONAL_PACKAGES', brotli=(None, 'gzip only')), \
+                    self.assertLogs('ProgrammingWorkshop.static', 'WARNING') as logs:
+                call_command('collectstatic', interactive=False, verbosity=0)
+            self.assertIn('brotli is not installed, gzip only', logs.output[-1])
+            with open(os.path.join(directory, 'staticfiles.json'), encoding='utf-8') as file:
+                hashed = json.load(file)['paths']['main.js']
+            self.assertTrue(os.path.exists(os.path.join(directory, hashed + '.gz')))
+            response = self.client.get('/static/' + hashed, HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('immutable', response['Cache-Control'])
+            response = self.client.get('/static/' + hashed)
+            self.assertNotIn('Content-Encoding', response)
+            self.assertIn(b'function', b''.join(response.streaming_content))
+            self.assertNotIn('immutable', self.client.get('/static/main.js')['Cache-Control'])
+
+    def test_pages_compressed(self):
+        response = self.client.get(reverse('users:login'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+class CounterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.it = Industry.objects.create(name='IT')
+        cls.finance = Industry.objects.create(name='Finance')
+        cls.company = Company.objects.create(name='Acme', nip='0000000001', address='Street', city='City',
+                                             industry=cls.it)
+
+    def counts(self):
+        company = Company.objects.get(pk=self.company.pk)
+        return (company.contact_count, company.note_count, Industry.objects.get(pk=self.it.pk).company_count,
+                Industry.objects.get(pk=self.finance.pk).company_count)
+
+    def test_counters_follow_writes(self):
+        self.assertEqual(self.counts(), (0, 0, 1, 0))
+        person = ContactPerson.objects.create(name='Jan', surname='Kowalski', phone='600100200',
+                                              mail='jan@acme.pl', company=self.company)
+        notes = [Note.objects.create(content='Note %d' % i, company=self.company) for i in range(3)]
+        self.assertEqual(self.counts(), (1, 3, 1, 0))
+        Note.objects.filter(pk__in=[note.pk for note in notes[:2]]).soft_delete()
+        person.is_deleted = True
+        person.save()
+        self.assertEqual(self.counts(), (0, 1, 1, 0))
+        company = Company.objects.get(pk=self.company.pk)
+        company.industry = self.finance
+        company.save()
+        self.assertEqual(self.counts(), (0, 1, 0, 1))
+        Company.objects.filter(pk=self.company.pk).update_rows(industry=self.it)
+        self.assertEqual(self.counts(), (0, 1, 1, 0))
+        Company.objects.filter(pk=self.company.pk).soft_delete()
+        self.assertEqual(self.counts(), (0, 1, 0, 0))
+        self.assertEqual(industries.get(self.it.pk).company_count, 0)
+
+    def test_bulk_industry_change_recounts_only_moved_industries(self):
+        retail = Industry.objects.create(name='Retail')
+        Industry.objects.filter(pk=retail.pk).update(company_count=7)
+        Company.objects.filter(pk=self.company.pk).update_rows(industry=self.finance)
+        self.assertEqual(self.counts(), (0, 0, 0, 1))
+        self.assertEqual(Industry.objects.get(pk=retail.pk).company_count, 7)
+
+    def test_rebuild_fixes_drift(self):
+        Note.objects.create(content='Note', company=self.company)
+        Company.objects.update(note_count=7)
+        Industry.objects.update(company_count=7)
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.assertIn('fixed 1', out.getvalue())
+        self.assertEqual(self.counts(), (0, 1, 1, 0))
+
+
+class DetailItemsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(login='tester', name='Test', surname='User', date_of_birth='2000-01-01',
+                                       role_id=Role.objects.create(role_name='regular user'))
+        cls.company = Company.objects.create(name='Acme', nip='0000000001', address='Street', city='City')
+        cls.notes = [Note.objects.create(content='Note number %d' % i, company=cls.company) for i in range(25)]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_notes_loaded_newest_first_in_pages(self):
+        response = self.client.get(reverse('CRM:detail', args=[self.company.id]))
+        self.assertEqual([note.pk for note in response.context['notes']], [note.pk for note in self.notes[:4:-1]])
+        self.assertNotContains(response, 'Note number 4<')
+        next_url = '%s?after=%d' % (reverse('CRM:detail_notes', args=[self.company.id]), self.notes[5].pk)
+        self.assertContains(response, 'data-url="%s"' % next_url)
+        response = self.client.get(next_url)
+        self.assertEqual([note.pk for note in response.context['page']], [note.pk for note in self.notes[4::-1]])
+        self.assertContains(response, 'Note number 0<')
+        self.assertNotContains(response, 'load-more')
+
+
+class ChangeLogTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(login='tester', name='Test', surname='User', date_of_birth='2000-01-01',
+                                       role_id=Role.objects.create(role_name='moderator'))
+        cls.industry = Industry.objects.create(name='IT')
+        cls.company = Company.objects.create(name='Acme', nip='0000000001', address='Street', city='City',
+                                             industry=cls.industry)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def entries(self, model):
+        return list(ChangeLog.objects.filter(model=model).order_by('pk'))
+
+    def test_edits_and_deletes_logged_with_actor_and_diff(self):
+        self.client.post(reverse('CRM:edit_company', args=[self.company.id]), {
+            'name': 'Acme', 'nip': '0000000001', 'industry': self.industry.id, 'address': 'Avenue', 'city': 'City'
+        })
+        self.client.delete(reverse('CRM:edit_company', args=[self.company.id]))
+        create, update, delete = self.entries('CRM.company')
+        self.assertEqual((create.action, create.actor), (ChangeLog.CREATE, None))
+        self.assertEqual((update.action, update.actor, update.object_id),
+                         (ChangeLog.UPDATE, self.user, self.company.id))
+        self.assertEqual(update.changes, {'address': ['Street', 'Avenue'], 'user_id': [None, self.user.id]})
+        self.assertEqual((delete.action, delete.changes), (ChangeLog.DELETE, {'is_deleted': [False, True]}))
+        Company.objects.filter(pk=self.company.pk).update_rows(city='Poznan', is_deleted=True)
+        self.assertEqual(self.entries('CRM.company')[-1].changes, {'city': ['City', 'Poznan']})
+        with self.assertRaises(ValueError):
+            delete.save()
+
+    def test_password_masked_and_unchanged_saves_skipped(self):
+        self.user.set_password('Secret123')
+        self.user.save()
+        User.objects.get(pk=self.user.pk).save()
+        create, entry = self.entries('users.user')
+        self.assertEqual(entry.changes, {'password': ['', '***']})
+
+    def test_background_writer_batches_and_drains_on_stop(self):
+        batches = []
+
+        class Writer(ChangeLogWriter):
+            def write(self, entries):
+                batches.append(len(entries))
+                super().write([])
+
+        writer = Writer()
+        with override_settings(AUDIT_LOG_SYNC=False, AUDIT_LOG_QUEUE_SIZE=3, AUDIT_LOG_BATCH_SIZE=2):
+            writer.record([ChangeLog() for _ in range(5)])
+            writer.stop()
+        stats = writer.stats()
+        self.assertEqual(sum(batches), 5)
+        self.assertEqual((stats['queue_depth'], stats['overflows'], stats['batches']), (0, 2, len(batches)))
+        self.assertIn('audit', self.client.get(reverse('CRM:stats')).json())
+
+
+class ArchiveTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(login='author', name='Test', surname='User', date_of_birth='2000-01-01')
+        cls.leaver = User.objects.create(login='leaver', name='Test', surname='User', date_of_birth='2000-01-01',
+                                         is_deleted=True)
+        ChangeLog.objects.create(actor=cls.leaver, model='users.user', object_id=cls.leaver.pk, action=ChangeLog.UPDATE)
+        cls.industry = Industry.objects.create(name='IT')
+        cls.company = Company.objects.create(name='Acme', nip='0000000001', address='Street', city='City',
+                                             industry=cls.industry, user=cls.author)
+        cls.kept = Company.objects.create(name='Kept', nip='0000000002', address='Street', city='City')
+        cls.person = ContactPerson.objects.create(name='Jan', surname='Kowalski', phone='600100200',
+                                                  mail='jan@acme.pl', company=cls.company)
+        cls.note = Note.objects.create(content='Old note', company=cls.kept, user=cls.author)
+        Note.objects.create(content='Live note', company=cls.company)
+        Company.objects.filter(pk=cls.company.pk).soft_delete()
+        Note.objects.filter(pk=cls.note.pk).soft_delete()
+        Company.objects.filter(pk=cls.kept.pk).update_rows(is_deleted=True, updated_at=timezone.now())
+        User.objects.update(updated_at=timezone.now() - timedelta(days=60))
+        Company.objects.filter(pk=cls.company.pk).update(updated_at=timezone.now() - timedelta(days=60))
+        Note.objects.filter(pk=cls.note.pk).update(updated_at=timezone.now() - timedelta(days=60))
+
+    def test_archive_and_restore(self):
+        out = StringIO()
+        call_command('archive_deleted', '--batch-size=1', stdout=out)
+        self.assertIn('CRM.company: archived 1', out.getvalue())
+        self.assertEqual(set(Company.objects.all()), {self.kept})
+        self.assertEqual(Note.objects.count(), 0)
+        self.assertEqual(ArchivedRow.objects.filter(root_model='CRM.company', root_id=self.company.pk).count(), 3)
+        self.assertEqual(list(search_contacts('Kowalski')), [])
+        # Author of archived rows and leaver who wrote change log entries stay
+        self.assertEqual(User.objects.count(), 2)
+        ChangeLog.objects.filter(actor=self.leaver).delete()
+        call_command('archive_deleted', stdout=out)
+        self.assertEqual(set(User.objects.all()), {self.author})
+
+        call_command('restore_archived', 'CRM.contactperson', self.person.pk, stdout=out)
+        company = Company.objects.get(pk=self.company.pk)
+        self.assertEqual((company.is_deleted, company.user, company.industry), (True, self.author, self.industry))
+        person = ContactPerson.live.get(pk=self.person.pk)
+        self.assertEqual(person.mail, 'jan@acme.pl')
+        self.assertEqual(list(search_contacts('Kowalski')), [person.pk])
+        self.assertEqual(Note.objects.filter(company=self.company).count(), 1)
+        self.assertEqual(ArchivedRow.objects.filter(model='CRM.company').count(), 0)
+        with self.assertRaises(CommandError):
+            call_command('restore_archived', 'CRM.company', self.company.pk)
+        call_command('restore_archived', 'CRM.note', self.note.pk, stdout=out)
+        self.assertEqual(Note.live.get(pk=self.note.pk).user, self.author)
+
+    def test_restore_of_taken_unique_value_refused(self):
+        call_command('archive_deleted', stdout=StringIO())
+        Company.objects.create(name='New Acme', nip='0000000001', address='Street', city='City')
+        with self.assertRaisesMessage(CommandError, 'CRM.Company nip 0000000001 is already used'):
+            call_command('restore_archived', 'CRM.company', self.company.pk)
+        self.assertEqual(ArchivedRow.objects.filter(root_model='CRM.company', root_id=self.company.pk).count(), 3)
+
+
+class ReportTest(QueryBudgetTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(login='tester', name='Test', surname='User', date_of_birth='2000-01-01',
+                                       role_id=Role.objects.create(role_name='moderator'))
+        cls.it = Industry.objects.create(name='IT')
+        cls.finance = Industry.objects.create(name='Finance')
+        cls.acme = Company.objects.create(name='Acme', nip='0000000001', address='Street', city='Gdansk',
+                                          industry=cls.it, user=cls.user)
+        cls.other = Company.objects.create(name='Other', nip='0000000002', address='Street', city='Poznan',
+                                           industry=cls.it)
+        Note.objects.create(content='Note', company=cls.acme)
+        ContactPerson.objects.create(name='Jan', surname='Kowalski', phone='600100200', mail='jan@acme.pl',
+                                     company=cls.acme)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def report(self, dimension):
+        return {row.key: (row.companies, row.contacts, row.notes)
+                for row in ReportRow.objects.filter(dimension=dimension)}
+
+    def test_rows_follow_writes(self):
+        self.assertEqual(self.report('industry'), {str(self.it.pk): (2, 1, 1)})
+        self.assertEqual(self.report('user'), {str(self.user.pk): (1, 1, 1), '': (1, 0, 0)})
+        acme = Company.objects.get(pk=self.acme.pk)
+        acme.industry = self.finance
+        acme.city = 'Poznan'
+        acme.save()
+        self.assertEqual(self.report('industry'), {str(self.it.pk): (1, 0, 0), str(self.finance.pk): (1, 1, 1)})
+        self.assertEqual(self.report('city'), {'Poznan': (2, 1, 1)})
+        Note.objects.filter(company=self.acme).soft_delete()
+        self.assertEqual(self.report('city'), {'Poznan': (2, 1, 0)})
+        Company.objects.filter(pk=self.other.pk).update_rows(industry=self.finance, city='Gdansk')
+        self.assertEqual(self.report('industry'), {str(self.finance.pk): (2, 1, 0)})
+        self.assertEqual(self.report('city'), {'Poznan': (1, 1, 0), 'Gdansk': (1, 0, 0)})
+        Company.objects.filter(pk=self.acme.pk).soft_delete()
+        Company.objects.filter(pk=self.acme.pk).soft_delete()
+        self.assertEqual(self.report('user'), {'': (1, 0, 0)})
+        Company.objects.filter(pk=self.acme.pk).update_rows(is_deleted=False)
+        self.assertEqual(self.report('user'), {str(self.user.pk): (1, 1, 0), '': (1, 0, 0)})
+        self.assertFalse(any(drifted(dimension) for dimension in DIMENSIONS))
+
+    def test_edit_of_stale_company_moves_current_counts(self):
+        acme = Company.objects.get(pk=self.acme.pk)
+        Note.objects.create(content='Another note', company=self.acme)
+        acme.industry = self.finance
+        acme.save(update_fields=['industry', 'updated_at'])
+        self.assertEqual(Company.objects.get(pk=self.acme.pk).note_count, 2)
+        self.assertEqual(self.report('industry')[str(self.finance.pk)], (1, 1, 2))
+        self.assertFalse(any(drifted(dimension) for dimension in DIMENSIONS))
+
+    def test_bulk_update_moves_only_changed_rows(self):
+        # Drifted row of untouched key stays, so nothing was regrouped
+        ReportRow.objects.create(dimension='city', key='Krakow', companies=1)
+        Company.objects.filter(pk__in=[self.acme.pk, self.other.pk]).update_rows(city='Gdansk', industry=self.finance)
+        self.assertEqual(self.report('city'), {'Gdansk': (2, 1, 1), 'Krakow': (1, 0, 0)})
+        self.assertEqual(self.report('industry'), {str(self.finance.pk): (2, 1, 1)})
+        Company.objects.filter(pk=self.other.pk).soft_delete()
+        Company.objects.filter(pk=self.other.pk).soft_delete()
+        self.assertEqual(self.report('city')['Gdansk'], (1, 1, 1))
+
+    def test_rebuild_repairs_drift(self):
+        ReportRow.objects.filter(dimension='city').update(companies=9)
+        ReportRow.objects.create(dimension='user', key='999', companies=1)
+        out = StringIO()
+        call_command('rebuild_reports', '--check', stdout=out)
+        self.assertIn('city: 2 drifted', out.getvalue())
+        self.assertIn('user: 1 drifted', out.getvalue())
+        call_command('rebuild_reports', stdout=out)
+        self.assertEqual(self.report('city'), {'Gdansk': (1, 1, 1), 'Poznan': (1, 0, 0)})
+        self.assertNotIn('999', self.report('user'))
+
+    def test_report_reads_only_summary_rows(self):
+        def add_companies():
+            start = Company.objects.count()
+            for i in range(start, start + 3):
+                Company.objects.create(name='Company %d' % i, nip='%010d' % (i + 10), address='Street',
+                                       city='City %d' % i, user=User.objects.create(
+                                           login='owner%d' % i, name='Name', surname='Surname',
+                                           date_of_birth='2000-01-01'))
+        self.assertQueryCountConstant([reverse('CRM:report')], add_companies)
+        self.assertWithinQueryBudget(reverse('CRM:report'))
+        response = self.client.get(reverse('CRM:report'))
+        self.assertContains(response, '<td>tester</td>')
+        self.assertContains(response, '<td>No owner</td>')
+        self.assertEqual(response.context['totals'], {'companies': 8, 'contacts': 1, 'notes': 1})
+
+
+class SyncTest(QueryBudgetTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(login='tester', name='Test', surname='User', date_of_birth='2000-01-01')
+        cls.company = Company.objects.create(name='Acme', nip='0000000001', address='Street', city='Gdansk')
+        cls.note = Note.objects.create(content='Note', company=cls.company)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def sync(self, since=0, **params):
+        return self.client.get(reverse('CRM:sync'), {'since': since, **params}).json()
+
+    def test_changes_after_token(self):
+        data = self.sync()
+        self.assertEqual([(row['model'], row['id']) for row in data['changes']],
+                         [('company', self.company.pk), ('note', self.note.pk)])
+        self.assertEqual(data['changes'][0]['data']['note_count'], 1)
+        self.assertEqual(self.sync(data['token'])['changes'], [])
+        person = ContactPerson.objects.create(name='Jan', surname='Kowalski', phone='600100200', mail='jan@acme.pl',
+                                              company=self.company)
+        Note.objects.filter(pk=self.note.pk).soft_delete()
+        changes = self.sync(data['token'])['changes']
+        self.assertEqual([(row['model'], row['id'], row['deleted']) for row in changes],
+                         [('contactperson', person.pk, False), ('company', self.company.pk, False),
+                          ('note', self.note.pk, True)])
+        self.assertIsNone(changes[2]['data'])
+
+    def test_batches(self):
+        for i in range(3):
+            Note.objects.create(content='Note %d' % i, company=self.company)
+        first = self.sync(limit=2)
+        self.assertTrue(first['has_more'])
+        second = self.sync(first['token'], limit=2)
+        self.assertEqual(len(second['changes']), 2)
+        self.assertFalse(self.sync(second['token'], limit=2)['has_more'])
+        self.assertWithinQueryBudget(reverse('CRM:sync') + '?since=0')
+        self.assertEqual(self.client.get(reverse('CRM:sync'), {'since': 'x'}).status_code, 400)
+
+
+CACHED_TEMPLATES = [dict(settings.TEMPLATES[0], APP_DIRS=False, OPTIONS=dict(settings.TEMPLATES[0]['OPTIONS'], loaders=[
+    ('django.template.loaders.cached.Loader', ['django.template.loaders.filesystem.Loader',
+                                               'django.template.loaders.app_directories.Loader']),
+]))]
+
+
+class WarmupTest(TestCase):
+
+    @override_settings(TEMPLATES=CACHED_TEMPLATES)
+    def test_templates_compiled_before_requests(self):
+        out = StringIO()
+        call_command('warmup', stdout=out)
+        for phase in ('urls', 'templates', 'database'):
+            self.assertIn(phase, out.getvalue())
+        cached = engines['django'].engine.template_loaders[0].get_template_cache
+        self.assertIn('base.html', cached)
+        self.assertIn('CRM/detail.html', cached)
+
+
+class ProfilingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.moderator = User.objects.create(login='moderator', name='Test', surname='User', date_of_birth='2000-01-01',
+                                            role_id=Role.objects.create(role_name='moderator'))
+        cls.user = User.objects.create(login='tester', name='Test', surname='User', date_of_birth='2000-01-01')
+        cls.company = Company.objects.create(name='Acme', nip='0000000001', address='Street', city='Gdansk')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def detail(self, user, **headers):
+        self.client.force_login(user)
+        with override_settings(PROFILING_DIR=self.directory, PROFILING_MAX_DUMPS=1):
+            return self.client.get(reverse('CRM:detail', args=[self.company.pk]), **headers)
+
+    def test_slow_requests_logged_with_timing_breakdown(self):
+        self.client.force_login(self.user)
+        with override_settings(SLOW_REQUEST_THRESHOLD=0), self.assertLogs('ProgrammingWorkshop.slow_requests') as logs:
+            self.client.get(reverse('CRM:detail', args=[self.company.pk]))
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((entry['url_name'], entry['user_id'], entry['status']), ('CRM:detail', self.user.pk, 200))
+        self.assertGreater(entry['queries'], 0)
+        self.assertAlmostEqual(entry['db_ms'] + entry['app_ms'], entry['total_ms'], delta=0.2)
+
+    def test_moderator_request_profiled_on_header(self):
+        self.assertNotIn('X-Profile', self.detail(self.user, HTTP_X_PROFILE='1'))
+        self.assertNotIn('X-Profile', self.detail(self.moderator))
+        self.assertEqual(os.listdir(self.directory), [])
+        name = self.detail(self.moderator, HTTP_X_PROFILE='1')['X-Profile']
+        with open(os.path.join(self.directory, name + '.json')) as file:
+            dump = json.load(file)
+        self.assertEqual(dump['url_name'], 'CRM:detail')
+        self.assertTrue(any('CRM_company' in query['sql'] for query in dump['sql']))
+        newer = self.detail(self.moderator, HTTP_X_PROFILE='1')['X-Profile']
+        self.assertEqual(sorted(os.listdir(self.directory)), [newer + '.json', newer + '.prof'])
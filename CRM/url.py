@@ -13,6 +13,18 @@ urlpatterns = [
     path('note/<int:company_id>/<int:model_id>', views.AddNoteView.as_view(), name='edit_note'),
     path('person/<int:company_id>', views.AddPersonView.as_view(), name='add_person'),
     path('person/<int:company_id>/<int:model_id>', views.AddPersonView.as_view(), name='edit_person'),
+    path('company/bulk', views.BulkCompanyView.as_view(), name='bulk_company'),
+    path('note/bulk', views.BulkNoteView.as_view(), name='bulk_note'),
+    path('person/bulk', views.BulkPersonView.as_view(), name='bulk_person'),
     path('detail/<int:company_id>', views.DetailView.as_view(), name='detail'),
+    path('detail/<int:company_id>/notes', views.NoteListView.as_view(), name='detail_notes'),
+    path('detail/<int:company_id>/contacts', views.ContactListView.as_view(), name='detail_contacts'),
     path('search', views.SearchPersonView.as_view(), name='search'),
+    path('export', views.ExportView.as_view(), name='export'),
+    path('report', views.ReportView.as_view(), name='report'),
+    path('sync', views.SyncView.as_view(), name='sync'),
+    path('stats', views.StatsView.as_view(), name='stats'),
+    path('async/', views.async_index, name='async_index'),
+    path('async/detail/<int:company_id>', views.async_detail, name='async_detail'),
+    path('async/search', views.async_search, name='async_search'),
 ]
@@ -1,12 +1,48 @@
-from django.contrib.auth.mixins import LoginRequiredMixin
+import asyncio
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.core.paginator import Paginator
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseRedirect, HttpResponse, StreamingHttpResponse, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.views import View
+from django.views.decorators.http import condition
 
+from CRM.audit import change_log
+from CRM.export import EXPORTS, export_companies
 from CRM.forms import CompanyForm, NoteForm, ContactPersonForm
-from CRM.models import Company, Note, ContactPerson, Industry
+from CRM.fragments import fragment_stats, generation
+from CRM.models import Company, Note, ContactPerson, ReportRow, industries
+from CRM.search import search_contacts
+from CRM.sync import changes_since
+from ProgrammingWorkshop import warmup
+from ProgrammingWorkshop.concurrency import run_query, async_login_required
+from ProgrammingWorkshop.middleware import query_stats
+from ProgrammingWorkshop.pagination import KeysetPaginator
+from ProgrammingWorkshop.views import BulkUpdateView
+from users.models import User
+
+
+def page_etag(request, *changes):
+    """Return ETag of page from modification times of shown rows and user it is rendered for
+
+    Generation of fragments covers industries and author logins, CSRF cookie keeps token of page valid.
+    """
+    parts = (request.user.pk, request.user.role_id_id, request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+             generation()) + changes
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def index_etag(request, page_num=1):
+    return page_etag(request, Company.objects.last_change())
+
+
+def detail_etag(request, company_id):
+    changes = Company.objects.detail_changes(company_id)
+    return page_etag(request, *changes) if changes else None
 
 
 class IndexView(LoginRequiredMixin, View):
@@ -14,16 +50,16 @@ class IndexView(LoginRequiredMixin, View):
     login_url = 'users:login'
     redirect_field_name = 'redirect'
     template = 'CRM/index.html'
+    query_budget = 5
+    read_only = True
 
+    @method_decorator(condition(etag_func=index_etag))
     def get(self, request, page_num=1):
         """Render administration page"""
-        industry_filter = request.GET.get('filter', None)
-        companies = Company.objects.filter(is_deleted=False)
-        if industry_filter:
-            companies = companies.filter(industry__id=industry_filter)
-        company_pages = Paginator(companies.order_by('id'), 10)
-        company_list = company_pages.get_page(page_num)
-        return render(request, self.template, {'company_list': company_list, 'industry_list': Industry.objects.all()})
+        companies = Company.live.for_list().filter_list(request.GET.get('filter'), request.GET.get('user'))
+        company_pages = KeysetPaginator(companies, 10)
+        company_list = company_pages.get_page(request.GET.get('after'), request.GET.get('before'), request.GET)
+        return render(request, self.template, {'company_list': company_list, 'industry_list': industries.all()})
 
 
 class AddCompany(LoginRequiredMixin, View):
@@ -47,15 +83,14 @@ class AddCompany(LoginRequiredMixin, View):
         if form.is_valid():
             company = form.save(commit=False)
             company.user = request.user
-            company.save()
+            # Edits write only form fields, counts loaded with company may be stale by now
+            company.save(update_fields=[*form.fields, 'user', 'updated_at'] if company_id else None)
             return HttpResponseRedirect(reverse('CRM:detail', args=[company.id]))
         return render(request, self.template, {'title': 'Add Company', 'form': form})
 
     @staticmethod
     def delete(request, company_id):
-        company = Company.objects.get(pk=company_id)
-        company.is_deleted = True
-        company.save()
+        Company.objects.filter(pk=company_id).soft_delete()
         return HttpResponse(status=200)
 
 
@@ -89,9 +124,7 @@ class AddModel(LoginRequiredMixin, View):
 
     def delete(self, request, company_id, model_id):
         """Delete model"""
-        model = self.model.objects.get(pk=model_id)
-        model.is_deleted = True
-        model.save()
+        self.model.objects.filter(pk=model_id).soft_delete()
         return HttpResponse(status=200)
 
 
@@ -107,27 +140,220 @@ class AddPersonView(AddModel):
     model = ContactPerson
 
 
+class BulkCompanyView(BulkUpdateView):
+    """View deleting or updating many companies"""
+    model = Company
+    form = CompanyForm
+    fields = ('industry', 'city')
+
+
+class BulkNoteView(BulkUpdateView):
+    """View deleting many notes"""
+    model = Note
+    form = NoteForm
+
+
+class BulkPersonView(BulkUpdateView):
+    """View deleting or updating many contact people"""
+    model = ContactPerson
+    form = ContactPersonForm
+    fields = ('phone', 'mail')
+
+
 class DetailView(LoginRequiredMixin, View):
     """View for company details"""
     login_url = 'users:login'
     redirect_field_name = 'redirect'
     template = 'CRM/detail.html'
+    query_budget = 6
+    read_only = True
 
+    @method_decorator(condition(etag_func=detail_etag))
     def get(self, request, company_id):
         """Render detail view for user"""
-        company = Company.objects.all().filter(is_deleted=False).get(pk=company_id)
-        notes = Note.objects.all().filter(company=company).filter(is_deleted=False)
-        contacts = ContactPerson.objects.all().filter(company=company).filter(is_deleted=False)
+        company = Company.live.for_detail().get(pk=company_id)
+        notes = NoteListView.get_page(company.pk)
+        contacts = ContactListView.get_page(company.pk)
         return render(request, self.template, {'company': company, 'notes': notes, 'contacts': contacts})
 
 
+class CompanyItemsView(LoginRequiredMixin, View):
+    """View rendering page of company notes or contact people, newest first, main.js appends pages on scroll"""
+    login_url = 'users:login'
+    redirect_field_name = 'redirect'
+    template = None
+    model = None
+    per_page = 20
+    query_budget = 2
+    read_only = True
+
+    @classmethod
+    def get_page(cls, company_id, after=None):
+        """Return page of live rows of company older than after cursor"""
+        rows = cls.model.live.for_detail().filter(company_id=company_id)
+        return KeysetPaginator(rows, cls.per_page, newest_first=True).get_page(after)
+
+    def get(self, request, company_id):
+        page = self.get_page(company_id, request.GET.get('after'))
+        return render(request, self.template, {'page': page, 'company_id': company_id})
+
+
+class NoteListView(CompanyItemsView):
+    """View rendering page of company notes"""
+    template = 'CRM/note_list.html'
+    model = Note
+
+
+class ContactListView(CompanyItemsView):
+    """View rendering page of company contact people"""
+    template = 'CRM/contact_list.html'
+    model = ContactPerson
+
+
 class SearchPersonView(LoginRequiredMixin, View):
-    """View for searching contact person by surname"""
+    """View for searching contact people by name, surname, mail, phone or company"""
     login_url = 'users:login'
     redirect_field_name = 'redirect'
     template = 'CRM/search.html'
+    query_budget = 5
+    read_only = True
+    per_page = 20
 
     def get(self, request):
-        query = request.GET.get('search')
-        people = ContactPerson.objects.filter(is_deleted=False).filter(surname=query) if query else []
-        return render(request, self.template, {'people': people})
+        query = request.GET.get('search', '')
+        people = Paginator(search_contacts(query), self.per_page).get_page(request.GET.get('page'))
+        found = ContactPerson.live.for_search().in_bulk(people.object_list)
+        people.object_list = [found[pk] for pk in people.object_list if pk in found]
+        return render(request, self.template, {'people': people, 'query': query})
+
+
+class ExportView(LoginRequiredMixin, View):
+    """View streaming live companies with contacts and notes"""
+    login_url = 'users:login'
+    redirect_field_name = 'redirect'
+
+    def get(self, request):
+        file_format = request.GET.get('format', 'csv')
+        if file_format not in EXPORTS:
+            return HttpResponseBadRequest('Unknown format')
+        _, content_type = EXPORTS[file_format]
+        # Filters are checked before streaming starts, errors inside the stream would end 200 response early
+        try:
+            industry, user = (int(request.GET[name]) if request.GET.get(name) else None for name in ('filter', 'user'))
+        except ValueError:
+            return HttpResponseBadRequest('Expected integer filter and user')
+        lines = export_companies(file_format, industry, user)
+        response = StreamingHttpResponse(lines, content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="companies.%s"' % file_format
+        return response
+
+
+class ReportView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """View rendering totals of live companies, contacts and notes per industry, city and owner from report rows"""
+    login_url = 'users:login'
+    redirect_field_name = 'redirect'
+    template = 'CRM/report.html'
+    top = 20
+    query_budget = 4
+    read_only = True
+
+    def get(self, request):
+        # Industries are few, all of them are read and give totals of whole CRM
+        by_industry = list(ReportRow.objects.filter(dimension=ReportRow.INDUSTRY).order_by('-companies', 'key'))
+        by_city = ReportRow.objects.filter(dimension=ReportRow.CITY).order_by('-companies', 'key')[:self.top]
+        by_user = list(ReportRow.objects.filter(dimension=ReportRow.USER).order_by('-companies', 'key')[:self.top])
+        logins = dict(User.objects.filter(pk__in=[row.key for row in by_user if row.key]).values_list('pk', 'login'))
+        for row in by_industry:
+            row.label = getattr(industries.get(int(row.key)) if row.key else None, 'name', 'No industry')
+        for row in by_user:
+            row.label = logins.get(int(row.key), 'No owner') if row.key else 'No owner'
+        totals = {field: sum(getattr(row, field) for row in by_industry)
+                  for field in ('companies', 'contacts', 'notes')}
+        report_tables = (('Industry', by_industry), ('City', by_city), ('Owner', by_user))
+        return render(request, self.template, {'report_tables': report_tables, 'totals': totals})
+
+    def test_func(self):
+        """Check if user is moderator"""
+        return self.request.user.moderator
+
+
+class SyncView(LoginRequiredMixin, View):
+    """View returning companies, contact people and notes changed after token, oldest change first
+
+    Clients keep returned token and pass it as since parameter, deleted rows come with "deleted": true and no data.
+    """
+    login_url = 'users:login'
+    redirect_field_name = 'redirect'
+    limit = 500
+    query_budget = 4
+    read_only = True
+
+    def get(self, request):
+        try:
+            since = int(request.GET.get('since', 0))
+            limit = min(int(request.GET.get('limit', self.limit)), self.limit)
+        except ValueError:
+            return JsonResponse({'status': 'Expected integer since and limit'}, status=400)
+        if since < 0 or limit < 1:
+            return JsonResponse({'status': 'Expected integer since and limit'}, status=400)
+        changes = changes_since(since, limit + 1)
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        rows = [{
+            'model': change.model.split('.')[1],
+            'id': change.object_id,
+            'deleted': obj is None or obj.is_deleted,
+            'data': None if obj is None or obj.is_deleted else obj.field_values(),
+        } for change, obj in changes]
+        token = changes[-1][0].pk if changes else since
+        return JsonResponse({'changes': rows, 'token': token, 'has_more': has_more})
+
+
+class StatsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """View returning cache, query and change log counters and warm-up timings of this process"""
+    login_url = 'users:login'
+    redirect_field_name = 'redirect'
+
+    def get(self, request):
+        return JsonResponse({'fragments': fragment_stats.snapshot(), 'queries': query_stats.snapshot(),
+                             'audit': change_log.stats(), 'warmup': warmup.timings})
+
+    def test_func(self):
+        """Check if user is moderator"""
+        return self.request.user.moderator
+
+
+@async_login_required()
+async def async_index(request, page_num=1):
+    """Render company list, page and industries are fetched concurrently"""
+    companies = Company.live.for_list().filter_list(request.GET.get('filter'), request.GET.get('user'))
+    company_list, industry_list = await asyncio.gather(
+        run_query(KeysetPaginator(companies, 10).get_page)(request.GET.get('after'), request.GET.get('before'),
+                                                           request.GET),
+        run_query(industries.all)(),
+    )
+    return await run_query(render)(request, IndexView.template,
+                                   {'company_list': company_list, 'industry_list': industry_list})
+
+
+@async_login_required()
+async def async_detail(request, company_id):
+    """Render company detail, company, notes and contacts are fetched concurrently"""
+    company, notes, contacts = await asyncio.gather(
+        run_query(Company.live.for_detail().get)(pk=company_id),
+        run_query(NoteListView.get_page)(company_id),
+        run_query(ContactListView.get_page)(company_id),
+    )
+    return await run_query(render)(request, DetailView.template,
+                                   {'company': company, 'notes': notes, 'contacts': contacts})
+
+
+@async_login_required()
+async def async_search(request):
+    """Render contact search results"""
+    query = request.GET.get('search', '')
+    ids = await run_query(search_contacts)(query)
+    people = Paginator(ids, SearchPersonView.per_page).get_page(request.GET.get('page'))
+    found = await run_query(ContactPerson.live.for_search().in_bulk)(people.object_list)
+    people.object_list = [found[pk] for pk in people.object_list if pk in found]
+    return await run_query(render)(request, SearchPersonView.template, {'people': people, 'query': query})
@@ -0,0 +1,44 @@
+import json
+import math
+import time
+
+
+def percentile(values, percent):
+    """Return nearest-rank percentile of values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def summarize(latencies, elapsed, **extra):
+    """Return throughput and latency percentiles in milliseconds of measured requests"""
+    summary = {
+        'requests': len(latencies),
+        'throughput': len(latencies) / elapsed if elapsed else None,
+        'p50': percentile(latencies, 50) * 1000 if latencies else None,
+        'p95': percentile(latencies, 95) * 1000 if latencies else None,
+        'p99': percentile(latencies, 99) * 1000 if latencies else None,
+        'max': max(latencies) * 1000 if latencies else None,
+    }
+    summary.update(extra)
+    return summary
+
+
+def timed(function, *args, **kwargs):
+    """Call function and return its result with duration in seconds"""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def format_row(name, summary):
+    return '%-28s %6d req %9.1f req/s  p50 %8.2f ms  p95 %8.2f ms  p99 %8.2f ms' % (
+        name, summary['requests'], summary['throughput'] or 0, summary['p50'] or 0, summary['p95'] or 0,
+        summary['p99'] or 0,
+    )
+
+
+def save(path, results):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
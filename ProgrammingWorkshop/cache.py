@@ -0,0 +1,39 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+
+
+class ReferenceCache:
+    """Process local copy of small, rarely changing table
+
+    Copy is reloaded when version stored in default cache changes, writes to the table store new version.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.version_key = 'reference-version:%s' % model._meta.label_lower
+        self._version = None
+        self._rows = {}
+        post_save.connect(self.invalidate, sender=model, weak=False)
+        post_delete.connect(self.invalidate, sender=model, weak=False)
+
+    def _load(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid4().hex
+            cache.set(self.version_key, version, None)
+        if version != self._version:
+            self._rows = {row.pk: row for row in self.model._base_manager.order_by('pk')}
+            self._version = version
+        return self._rows
+
+    def all(self):
+        return list(self._load().values())
+
+    def get(self, pk):
+        """Return row with given pk or None"""
+        return self._load().get(pk)
+
+    def invalidate(self, **kwargs):
+        cache.set(self.version_key, uuid4().hex, None)
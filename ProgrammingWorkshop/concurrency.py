@@ -0,0 +1,39 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+from django.shortcuts import resolve_url
+
+from ProgrammingWorkshop.middleware import counting_queries
+
+
+def run_query(function):
+    """Wrap ORM work for async views
+
+    With ASYNC_CONCURRENT_QUERIES every call runs in a worker thread and connection of its own, so independent
+    queries of one request run at the same time. Otherwise calls share the thread of synchronous code.
+    """
+    concurrent = getattr(settings, 'ASYNC_CONCURRENT_QUERIES', True)
+
+    def run(*args, **kwargs):
+        try:
+            with counting_queries():
+                return function(*args, **kwargs)
+        finally:
+            if concurrent:
+                close_old_connections()
+    return sync_to_async(run, thread_sensitive=not concurrent)
+
+
+def async_login_required(login_url='users:login', redirect_field_name='redirect'):
+    """Redirect anonymous users of async view to login page, user is loaded outside of event loop"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if not await run_query(lambda: request.user.is_authenticated)():
+                return redirect_to_login(request.get_full_path(), resolve_url(login_url), redirect_field_name)
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
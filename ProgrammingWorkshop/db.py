@@ -0,0 +1,85 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.urls import Resolver404, resolve
+
+# Set while read-only view handles request, its queries are routed to READ_DATABASE
+reading = ContextVar('reading', default=False)
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    """Apply SQLITE_PRAGMAS to every new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+
+
+@contextmanager
+def read_database():
+    """Route reads of block to READ_DATABASE"""
+    token = reading.set(True)
+    try:
+        yield
+    finally:
+        reading.reset(token)
+
+
+class ReadRouter:
+    """Send reads of read-only views to READ_DATABASE and everything else to default database"""
+
+    def db_for_read(self, model, **hints):
+        alias = getattr(settings, 'READ_DATABASE', None)
+        return alias if alias and reading.get() else None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+def is_read_only(request):
+    """Check if request is GET or HEAD of view declaring read_only = True"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    try:
+        match = resolve(request.path_info, getattr(request, 'urlconf', None))
+    except Resolver404:
+        return False
+    view = getattr(match.func, 'view_class', match.func)
+    return getattr(view, 'read_only', False)
+
+
+class ReadRoutingMiddleware:
+    """Route queries of read-only views to READ_DATABASE"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not is_read_only(request):
+            return self.get_response(request)
+        with read_database():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not is_read_only(request):
+            return await self.get_response(request)
+        with read_database():
+            return await self.get_response(request)
@@ -0,0 +1,67 @@
+from django.db import models
+from django.utils import timezone
+
+from ProgrammingWorkshop.signals import rows_updated
+
+
+def field_names(model):
+    """Attribute names of concrete fields of model"""
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def updated_values(model, previous, values=None):
+    """Map pks of rows updated by rows_updated sender to their attribute values after the update
+
+    Values written to all rows are applied to previous ones, rows are read again only when some value is an
+    expression or values are not known.
+    """
+    if values is None or any(hasattr(value, 'resolve_expression') for value in values.values()):
+        return {row['pk']: row for row in model._base_manager.filter(pk__in=previous)
+                .values('pk', *field_names(model))}
+    written = {model._meta.get_field(name).attname: getattr(value, 'pk', value) for name, value in values.items()}
+    return {pk: dict(row, **written) for pk, row in previous.items()}
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    """Query set of models marked deleted with is_deleted flag"""
+
+    def live(self):
+        return self.filter(is_deleted=False)
+
+    def deleted(self):
+        return self.filter(is_deleted=True)
+
+    def update_rows(self, **values):
+        """Update matching rows with single UPDATE query, notify rows_updated receivers and return updated pks
+
+        Fields with auto_now are set like save() would set them. Values rows held before the update are read with the
+        same query which selects them, so receivers can apply exact changes instead of recomputing from all rows.
+        """
+        previous = {row['pk']: row for row in self.values('pk', *field_names(self.model))}
+        pks = list(previous)
+        if pks:
+            fields = set(values)
+            for field in self.model._meta.concrete_fields:
+                if getattr(field, 'auto_now', False) and field.name not in values:
+                    values[field.name] = timezone.now()
+            self.model._base_manager.filter(pk__in=pks).update(**values)
+            rows_updated.send(sender=self.model, pks=pks, fields=fields, values=values, previous=previous)
+        return pks
+
+    def delete_rows(self):
+        """Delete matching rows with single DELETE query, without delete signals and without cascading to relations
+
+        Caller is responsible for rows referencing deleted ones, archival moves them away first.
+        """
+        return self._raw_delete(self.db)
+
+    def soft_delete(self):
+        """Mark matching rows deleted with single UPDATE query and return their pks"""
+        return self.update_rows(is_deleted=True)
+
+
+class LiveManager(models.Manager):
+    """Manager returning only rows which are not soft deleted"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
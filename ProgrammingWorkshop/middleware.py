@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """Database execute wrapper counting queries and time spent in database"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self._lock:
+                self.count += 1
+                self.duration += time.perf_counter() - start
+
+
+# Counter of request being handled, copied into threads running queries of async views
+current_counter = ContextVar('current_counter', default=None)
+
+
+@contextmanager
+def counting_queries():
+    """Count queries run by connections of current thread with counter of current request"""
+    counter = current_counter.get()
+    with ExitStack() as stack:
+        if counter is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+        yield
+
+
+class QueryStats:
+    """Totals of requests, queries and database time per URL name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def add(self, url_name, queries, duration, over_budget):
+        with self._lock:
+            stats = self._stats.setdefault(url_name, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'db_time': 0.0, 'over_budget': 0,
+            })
+            stats['requests'] += 1
+            stats['queries'] += queries
+            stats['max_queries'] = max(stats['max_queries'], queries)
+            stats['db_time'] += duration
+            stats['over_budget'] += over_budget
+
+    def snapshot(self):
+        with self._lock:
+            return {url_name: dict(stats) for url_name, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+query_stats = QueryStats()
+
+
+def get_query_budget(match):
+    """Return query budget declared by resolved view or setting override"""
+    if match is None:
+        return None
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if match.view_name in budgets:
+        return budgets[match.view_name]
+    view = getattr(match.func, 'view_class', match.func)
+    return getattr(view, 'query_budget', None)
+
+
+class QueryBudgetMiddleware:
+    """Record queries and database time per URL name and flag requests over view query budget"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        token = current_counter.set(counter)
+        try:
+            with counting_queries():
+                response = self.get_response(request)
+        finally:
+            current_counter.reset(token)
+        return self.record(request, response, counter)
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        token = current_counter.set(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_counter.reset(token)
+        return self.record(request, response, counter)
+
+    def record(self, request, response, counter):
+        request.query_counter = counter
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.view_name if match else None
+        budget = get_query_budget(match)
+        over_budget = budget is not None and counter.count > budget
+        query_stats.add(url_name, counter.count, counter.duration, over_budget)
+        if over_budget:
+            logger.warning('%s ran %d queries, budget is %d (%s)', url_name, counter.count, budget, request.path)
+        if settings.DEBUG:
+            response['X-Query-Count'] = counter.count
+            response['X-Query-Time'] = '%.3f' % (counter.duration * 1000)
+            if over_budget:
+                response['X-Query-Budget-Exceeded'] = budget
+        return response
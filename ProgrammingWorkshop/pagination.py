@@ -0,0 +1,112 @@
+from django.db.models import Q
+from django.http import QueryDict
+
+
+class KeysetPage:
+    """Page of objects fetched by seeking on sort key instead of counting and offsetting"""
+
+    def __init__(self, object_list, has_previous, has_next, params=None, sort_key=None):
+        self.object_list = object_list
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self.params = params if params is not None else QueryDict()
+        self.sort_key = sort_key
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    def cursor(self, obj):
+        """Return cursor of object, primary key prefixed to value of sort key when pages are sorted by it"""
+        if self.sort_key is None:
+            return obj.pk
+        return '%s:%s' % (obj.pk, getattr(obj, self.sort_key))
+
+    def _query(self, cursor, value):
+        """Build query string for neighbouring page keeping other parameters"""
+        params = self.params.copy()
+        for key in ('after', 'before', 'page'):
+            params.pop(key, None)
+        params[cursor] = value
+        return params.urlencode()
+
+    def previous_query(self):
+        return self._query('before', self.cursor(self.object_list[0])) if self.object_list else ''
+
+    def next_query(self):
+        return self._query('after', self.cursor(self.object_list[-1])) if self.object_list else ''
+
+
+class KeysetPaginator:
+    """Paginator seeking on primary key, page cost does not depend on page depth
+
+    With newest_first pages run from highest primary key down and after cursor moves to older rows. With sort_key
+    pages are ordered by that field or annotation first and primary key breaks ties, newest_first reverses both.
+    """
+
+    def __init__(self, queryset, per_page, newest_first=False, sort_key=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.newest_first = newest_first
+        self.sort_key = sort_key
+
+    def parse_cursor(self, value):
+        """Return cursor as primary key and sort key value or None when missing or malformed"""
+        if not value:
+            return None
+        pk, separator, key = str(value).partition(':')
+        if (self.sort_key is None) == bool(separator):
+            return None
+        try:
+            return int(pk), key
+        except ValueError:
+            return None
+
+    def seek(self, cursor, lookup, inclusive=False):
+        """Filter rows on one side of cursor, lookup is 'gt' or 'lt'
+
+        Sort key range condition comes first on its own so the database can seek in index on sort key.
+        """
+        pk, key = cursor
+        pk_lookup = 'pk__%s%s' % (lookup, 'e' if inclusive else '')
+        if self.sort_key is None:
+            return self.queryset.filter(**{pk_lookup: pk})
+        return self.queryset.filter(**{'%s__%se' % (self.sort_key, lookup): key}).filter(
+            Q(**{'%s__%s' % (self.sort_key, lookup): key}) | Q(**{pk_lookup: pk})
+        )
+
+    def ordering(self, descending):
+        fields = ('pk',) if self.sort_key is None else (self.sort_key, 'pk')
+        return ['-' + field if descending else field for field in fields]
+
+    def get_page(self, after=None, before=None, params=None):
+        """Return page of objects after or before given cursor"""
+        after = self.parse_cursor(after)
+        before = self.parse_cursor(before)
+        forward, backward = ('lt', 'gt') if self.newest_first else ('gt', 'lt')
+        if before is not None:
+            rows = list(self.seek(before, backward).order_by(*self.ordering(not self.newest_first))[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = self.seek(before, forward, inclusive=True).exists()
+        else:
+            queryset = self.queryset if after is None else self.seek(after, forward)
+            rows = list(queryset.order_by(*self.ordering(self.newest_first))[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = after is not None and self.seek(after, backward, inclusive=True).exists()
+        return KeysetPage(rows, has_previous, has_next, params, self.sort_key)
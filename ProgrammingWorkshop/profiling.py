@@ -0,0 +1,142 @@
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+from contextlib import ExitStack, suppress
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connections
+
+from ProgrammingWorkshop.middleware import current_counter
+
+# Configured by LOGGING setting to write rotating SLOW_REQUEST_LOG, one JSON object per line
+slow_logger = logging.getLogger('ProgrammingWorkshop.slow_requests')
+
+
+class QueryRecorder:
+    """Database execute wrapper keeping SQL statements with their durations, parameters are left out"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({'sql': sql, 'many': many, 'ms': round((time.perf_counter() - start) * 1000, 3)})
+
+
+def counted():
+    """Queries and database time counted so far for current request, None without QueryBudgetMiddleware"""
+    counter = current_counter.get()
+    return (counter.count, counter.duration) if counter is not None else None
+
+
+def timing(request, response, total, counted_before):
+    """Describe handled request with its time split into database and application time"""
+    match = getattr(request, 'resolver_match', None)
+    user = getattr(request, 'user', None)
+    entry = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'url_name': match.view_name if match else None,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+        'total_ms': round(total * 1000, 1),
+        'queries': None,
+        'db_ms': None,
+        'app_ms': None,
+    }
+    counted_after = counted()
+    if counted_before is not None and counted_after is not None:
+        db_time = counted_after[1] - counted_before[1]
+        entry.update(queries=counted_after[0] - counted_before[0], db_ms=round(db_time * 1000, 1),
+                     app_ms=round((total - db_time) * 1000, 1))
+    return entry
+
+
+def prune(directory, keep):
+    """Remove all but keep newest dumps, names of dumps start with their time"""
+    dumps = sorted({name.rsplit('.', 1)[0] for name in os.listdir(directory)})
+    for dump in dumps[:max(len(dumps) - keep, 0)]:
+        for extension in ('.prof', '.json'):
+            # Other processes may prune the same directory
+            with suppress(FileNotFoundError):
+                os.remove(os.path.join(directory, dump + extension))
+
+
+def dump_profile(entry, profiler, recorder):
+    """Write call profile readable by pstats and JSON with request timing and SQL statements, return dump name"""
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = '%s-%s-%d' % (datetime.now().strftime('%Y%m%dT%H%M%S%f'),
+                         (entry['url_name'] or 'unresolved').replace(':', '-'), os.getpid())
+    profiler.dump_stats(os.path.join(directory, name + '.prof'))
+    with open(os.path.join(directory, name + '.json'), 'w', encoding='utf-8') as file:
+        json.dump(dict(entry, sql=recorder.queries), file, indent=1)
+    prune(directory, settings.PROFILING_MAX_DUMPS)
+    return name
+
+
+class ProfilingMiddleware:
+    """Profile requests of moderators on demand and log requests slower than SLOW_REQUEST_THRESHOLD
+
+    Moderator request is profiled when it sends PROFILING_HEADER or is picked with PROFILING_SAMPLE_RATE, response
+    names the dump in the same header. Times cover this middleware and everything below it, query counts come from
+    QueryBudgetMiddleware. Async requests are only timed, profiler of event loop thread would mix concurrent ones.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.PROFILING_HEADER.upper().replace('-', '_')
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def should_profile(self, request):
+        rate = settings.PROFILING_SAMPLE_RATE
+        if self.header not in request.META and not (rate and random.random() < rate):
+            return False
+        return getattr(request.user, 'moderator', False)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        start, counted_before = time.perf_counter(), counted()
+        if not self.should_profile(request):
+            response = self.get_response(request)
+            self.log_slow(request, response, time.perf_counter() - start, counted_before)
+            return response
+        profiler, recorder = cProfile.Profile(), QueryRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        total = time.perf_counter() - start
+        entry = timing(request, response, total, counted_before)
+        response[settings.PROFILING_HEADER] = dump_profile(entry, profiler, recorder)
+        self.log_slow(request, response, total, counted_before, entry)
+        return response
+
+    async def __acall__(self, request):
+        start, counted_before = time.perf_counter(), counted()
+        response = await self.get_response(request)
+        self.log_slow(request, response, time.perf_counter() - start, counted_before)
+        return response
+
+    @staticmethod
+    def log_slow(request, response, total, counted_before, entry=None):
+        threshold = settings.SLOW_REQUEST_THRESHOLD
+        if threshold is not None and total >= threshold:
+            slow_logger.info(json.dumps(entry or timing(request, response, total, counted_before)))
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+
+class CappedCache:
+    """Cache proxy storing entries for at most given number of seconds"""
+
+    def __init__(self, cache, timeout):
+        self.cache = cache
+        self.timeout = timeout
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(key, value, self.timeout if timeout is None else min(timeout, self.timeout))
+
+    def __getattr__(self, name):
+        return getattr(self.cache, name)
+
+    def __contains__(self, key):
+        return key in self.cache
+
+
+class SessionStore(CachedDBStore):
+    """Sessions cached for at most SESSION_CACHE_TIMEOUT seconds and written through to database
+
+    Logout or account delete drops cached session only in process which handled it, other processes with local
+    cache read it from database again once their copy expires.
+    """
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._cache = CappedCache(self._cache, getattr(settings, 'SESSION_CACHE_TIMEOUT', 300))
@@ -43,10 +43,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'ProgrammingWorkshop.static.StaticFilesMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
+    'ProgrammingWorkshop.middleware.QueryBudgetMiddleware',
+    'ProgrammingWorkshop.db.ReadRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'CRM.audit.AuditActorMiddleware',
+    'ProgrammingWorkshop.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,6 +77,19 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'ProgrammingWorkshop.wsgi.application'
 
+# WSGI and ASGI applications run ProgrammingWorkshop.warmup before serving first request
+WARM_UP = False
+
+# SERVER_PROFILE=production keeps templates compiled by cached loaders for the life of process, template changes need
+# restart, and warms every process up before it serves requests.
+if os.environ.get('SERVER_PROFILE') == 'production':
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ])]
+    WARM_UP = True
+
 
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
@@ -78,10 +97,80 @@ WSGI_APPLICATION = 'ProgrammingWorkshop.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get('DATABASE_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
     }
 }
 
+DATABASE_ROUTERS = ['ProgrammingWorkshop.db.ReadRouter']
+
+# Pragmas applied to every new SQLite connection
+SQLITE_PRAGMAS = {}
+
+# Database alias receiving queries of read-only views, None reads from default database
+READ_DATABASE = None
+
+# DATABASE_PROFILE=production turns on WAL journal, so readers do not wait for writers, tuned pragmas, persistent
+# connections and separate read connection. DATABASE_READ_NAME can point it at replica file kept in sync outside
+# of Django, by default it opens the same file.
+if os.environ.get('DATABASE_PROFILE') == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)),
+        'OPTIONS': {'timeout': 5},
+    })
+    DATABASES['read'] = dict(DATABASES['default'], NAME=os.environ.get('DATABASE_READ_NAME',
+                                                                       DATABASES['default']['NAME']),
+                             TEST={'MIRROR': 'default'})
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,
+        'mmap_size': 268435456,
+        'busy_timeout': 5000,
+        'temp_store': 'MEMORY',
+    }
+    READ_DATABASE = 'read'
+
+
+# Caches
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Rendered fragments and their versions are shared by all server processes and management commands on host, so
+    # a write in any of them drops fragments everywhere
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('FRAGMENT_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'fragments')),
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+}
+
+FRAGMENT_CACHE = 'fragments'
+FRAGMENT_CACHE_TIMEOUT = 3600
+
+# Sessions are read from cache and written through to database, users of sessions are cached with their role.
+# The 'sessions' cache is local to process, so cached sessions live at most SESSION_CACHE_TIMEOUT seconds and
+# database stays authoritative, logout in one process reaches the others once their copies expire.
+SESSION_ENGINE = 'ProgrammingWorkshop.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_CACHE_TIMEOUT = 300
+USER_CACHE = 'sessions'
+USER_CACHE_TIMEOUT = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -103,6 +192,63 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = 'users.User'
 
+TEST_RUNNER = 'ProgrammingWorkshop.testing.TestRunner'
+
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+
+# Run independent queries of async views in separate threads and connections
+ASYNC_CONCURRENT_QUERIES = True
+
+# Change log entries are queued and written by background thread in batches of AUDIT_LOG_BATCH_SIZE, at least every
+# AUDIT_LOG_FLUSH_INTERVAL seconds. When the queue is full the request writes its entry itself.
+AUDIT_LOG_SYNC = False
+AUDIT_LOG_QUEUE_SIZE = 10000
+AUDIT_LOG_BATCH_SIZE = 500
+AUDIT_LOG_FLUSH_INTERVAL = 1.0
+
+# Query budgets overriding the ones declared by views, keyed by URL name
+QUERY_BUDGETS = {}
+
+# Requests of moderators sending PROFILING_HEADER, or picked at PROFILING_SAMPLE_RATE, are profiled. Call profile
+# (.prof, read with pstats) and SQL statements with timings (.json) are written to PROFILING_DIR keeping
+# PROFILING_MAX_DUMPS newest dumps.
+PROFILING_HEADER = 'X-Profile'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_MAX_DUMPS = 100
+
+# Requests taking at least SLOW_REQUEST_THRESHOLD seconds are written to SLOW_REQUEST_LOG, rotated after
+# SLOW_REQUEST_LOG_MAX_BYTES keeping SLOW_REQUEST_LOG_BACKUPS old files. None turns the log off.
+SLOW_REQUEST_THRESHOLD = 1.0
+SLOW_REQUEST_LOG = os.path.join(BASE_DIR, 'slow_requests.log')
+SLOW_REQUEST_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_REQUEST_LOG_BACKUPS = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_REQUEST_LOG,
+            'maxBytes': SLOW_REQUEST_LOG_MAX_BYTES,
+            'backupCount': SLOW_REQUEST_LOG_BACKUPS,
+            'formatter': 'message',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'ProgrammingWorkshop.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
 
@@ -125,3 +271,8 @@ STATICFILES_DIRS = [
 ]
 
 STATIC_URL = '/static/'
+
+# collectstatic minifies, fingerprints and precompresses files into STATIC_ROOT, StaticFilesMiddleware serves them
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = 'ProgrammingWorkshop.static.CompressedManifestStaticFilesStorage'
+STATIC_MAX_AGE = 31536000
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent after rows were changed by single UPDATE query bypassing model save, with pks, names of updated fields, when
+# known values written to them and, when known, previous attribute values of rows keyed by pk
+rows_updated = Signal()
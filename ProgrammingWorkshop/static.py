@@ -0,0 +1,134 @@
+import gzip
+import logging
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.http import FileResponse
+from django.utils._os import safe_join
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+MINIFIERS = {}
+if rjsmin:
+    MINIFIERS['.js'] = rjsmin.jsmin
+if rcssmin:
+    MINIFIERS['.css'] = rcssmin.cssmin
+
+COMPRESSORS = [('.gz', 'gzip', lambda data: gzip.compress(data, 9, mtime=0))]
+if brotli:
+    COMPRESSORS.insert(0, ('.br', 'br', lambda data: brotli.compress(data, quality=11)))
+
+COMPRESSED_EXTENSIONS = ('.js', '.css', '.svg', '.json', '.map', '.txt', '.html', '.xml', '.ico')
+# Optional packages of the pipeline mapped to what collectstatic skips without them
+OPTIONAL_PACKAGES = {
+    'rjsmin': (rjsmin, 'scripts are not minified'),
+    'rcssmin': (rcssmin, 'stylesheets are not minified'),
+    'brotli': (brotli, 'brotli copies are not written, only gzip ones'),
+}
+
+
+def missing_packages():
+    """Warnings about optional packages which are not installed"""
+    return ['%s is not installed, %s' % (name, effect) for name, (module, effect) in OPTIONAL_PACKAGES.items()
+            if module is None]
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage minifying scripts and stylesheets and writing gzip and brotli copies of hashed files
+
+    Minifying needs rjsmin and rcssmin, brotli copies need brotli package, missing packages are skipped with warning.
+    """
+
+    def _save(self, name, content):
+        base, extension = os.path.splitext(name)
+        minify = MINIFIERS.get(extension)
+        if minify and not base.endswith('.min'):
+            content = ContentFile(minify(content.read().decode('utf-8')).encode('utf-8'))
+        return super()._save(name, content)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for warning in missing_packages():
+            logger.warning(warning)
+        for name in sorted(set(self.hashed_files.values())):
+            if name.endswith(COMPRESSED_EXTENSIONS):
+                self.compress(name)
+
+    def compress(self, name):
+        """Save compressed copies next to file, unless they are not noticeably smaller"""
+        with self.open(name) as file:
+            data = file.read()
+        for extension, _, compress in COMPRESSORS:
+            compressed = compress(data)
+            if self.exists(name + extension):
+                self.delete(name + extension)
+            if len(compressed) < len(data) * 0.95:
+                self._save(name + extension, ContentFile(compressed))
+
+
+class StaticFilesMiddleware:
+    """Serve collected static files, preferring precompressed copies
+
+    Hashed file names never change content, they are cached for STATIC_MAX_AGE and marked immutable.
+    """
+
+    def __init__(self, get_response):
+        if not settings.STATIC_ROOT or not settings.STATIC_URL:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(settings.STATIC_URL):
+            response = self.serve(request, request.path_info[len(settings.STATIC_URL):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        """Return response with static file or None when it was not collected"""
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except ValueError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        content_type, _ = mimetypes.guess_type(path)
+        accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        file_path, encoding = path, None
+        for extension, content_encoding, _ in COMPRESSORS:
+            if content_encoding in accepted and os.path.isfile(path + extension):
+                file_path, encoding = path + extension, content_encoding
+                break
+        response = FileResponse(open(file_path, 'rb'), filename=os.path.basename(path),
+                                content_type=content_type or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Vary'] = 'Accept-Encoding'
+        if name in self.hashed:
+            response['Cache-Control'] = 'public, max-age=%d, immutable' % getattr(settings, 'STATIC_MAX_AGE',
+                                                                                  31536000)
+        else:
+            response['Cache-Control'] = 'public, max-age=60'
+        return response
@@ -0,0 +1,64 @@
+import tempfile
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve
+
+from ProgrammingWorkshop.middleware import get_query_budget
+
+
+class QueryBudgetTestMixin:
+    """Test case assertions guarding views against queries growing with data"""
+
+    def count_queries(self, url, status=200, using='default'):
+        """Request url with test client and return number of queries it ran"""
+        with CaptureQueriesContext(connections[using]) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status)
+        return len(context)
+
+    def assertWithinQueryBudget(self, url, status=200):
+        """Fail when url runs more queries than its view declares"""
+        budget = get_query_budget(resolve(urlsplit(url).path))
+        self.assertIsNotNone(budget, 'View for %s does not declare query budget' % url)
+        count = self.count_queries(url, status)
+        self.assertLessEqual(count, budget, '%s ran %d queries, budget is %d' % (url, count, budget))
+
+    def measure(self, urls, add_rows, status):
+        """Add rows, warm up caches refilled after writes and count queries of every url"""
+        add_rows()
+        for url in urls:
+            self.client.get(url)
+        return [self.count_queries(url, status) for url in urls]
+
+    def assertQueryCountConstant(self, urls, add_rows, status=200):
+        """Fail when query count of any url changes after add_rows inserts more data"""
+        before = self.measure(urls, add_rows, status)
+        after = self.measure(urls, add_rows, status)
+        self.assertEqual(dict(zip(urls, after)), dict(zip(urls, before)), 'Query count grows with data size')
+
+
+class TestRunner(DiscoverRunner):
+    """Test runner rendering static URLs without collected manifest, writing change log synchronously, no slow
+    request log and fragments cached in temporary directory
+
+    Tests run with DEBUG off and each in its own transaction, which the change log thread could not see.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.fragment_directory = tempfile.TemporaryDirectory()
+        fragments = dict(settings.CACHES['fragments'], LOCATION=self.fragment_directory.name)
+        self.static_settings = override_settings(
+            STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage', AUDIT_LOG_SYNC=True,
+            SLOW_REQUEST_THRESHOLD=None, CACHES=dict(settings.CACHES, fragments=fragments),
+        )
+        self.static_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.static_settings.disable()
+        self.fragment_directory.cleanup()
+        super().teardown_test_environment(**kwargs)
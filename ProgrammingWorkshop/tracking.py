@@ -0,0 +1,27 @@
+class LoadedValuesMixin:
+    """Model mixin keeping field values loaded from database
+
+    Receivers of post_save compare them with saved values to find changed fields without querying, the copy is
+    refreshed once save() returns.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_values = instance.field_values()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.loaded_values = self.field_values()
+
+    def field_values(self):
+        """Values of concrete fields which are loaded, keyed by attribute name"""
+        return {field.attname: self.__dict__[field.attname] for field in self._meta.concrete_fields
+                if field.attname in self.__dict__}
+
+    def changed_values(self):
+        """Map attribute names of fields changed since load to old and new value, every field of new objects"""
+        loaded = getattr(self, 'loaded_values', {})
+        return {name: (loaded.get(name), value) for name, value in self.field_values().items()
+                if name not in loaded or loaded[name] != value}
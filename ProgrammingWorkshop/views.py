@@ -0,0 +1,63 @@
+import json
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.views import View
+
+
+class BulkUpdateView(LoginRequiredMixin, View):
+    """View soft deleting or updating many rows with single UPDATE query
+
+    Body is JSON object with list of ids and either "action": "delete" or "values" mapping field names to new
+    values, which are cleaned by fields of form.
+    """
+    login_url = 'users:login'
+    redirect_field_name = 'redirect'
+    model = None
+    form = None
+    fields = ()
+    limit = 500
+
+    def get_queryset(self, request):
+        """Rows request user is allowed to change"""
+        return self.model.live.all()
+
+    def get_fields(self, request):
+        """Names of fields request user is allowed to update"""
+        return self.fields
+
+    def clean_values(self, request, values):
+        """Return values cleaned by form fields, raise ValidationError for invalid or not allowed fields"""
+        if not isinstance(values, dict) or not values:
+            raise ValidationError('Nothing to update')
+        allowed = self.get_fields(request)
+        cleaned = {}
+        for name, value in values.items():
+            if name not in allowed:
+                raise ValidationError('Field %s can not be updated' % name)
+            cleaned[name] = self.form.base_fields[name].clean(value)
+        return cleaned
+
+    def updated(self, request, pks):
+        """Hook called with pks of changed rows"""
+
+    def post(self, request):
+        """Delete or update rows with given ids"""
+        try:
+            data = json.loads(request.body)
+            ids = [int(pk) for pk in data['ids']]
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'status': 'Expected JSON object with list of ids'}, status=400)
+        if len(ids) > self.limit:
+            return JsonResponse({'status': 'At most %d ids at once' % self.limit}, status=400)
+        rows = self.get_queryset(request).filter(pk__in=ids)
+        if data.get('action') == 'delete':
+            pks = rows.soft_delete()
+        else:
+            try:
+                pks = rows.update_rows(**self.clean_values(request, data.get('values')))
+            except ValidationError as error:
+                return JsonResponse({'status': ' '.join(error.messages)}, status=400)
+        self.updated(request, pks)
+        return JsonResponse({'status': 'Success', 'updated': pks, 'skipped': sorted(set(ids) - set(pks))})
@@ -0,0 +1,61 @@
+import logging
+import os
+import time
+
+from django.db import connections
+from django.template import engines
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+# Phase durations of last warm-up of this process in milliseconds
+timings = {}
+
+
+def populate_urls():
+    """Import URLconf modules with views they route to and build lookup tables of resolver and reverse()"""
+    resolver = get_resolver()
+    resolver.reverse_dict
+    return len(resolver.url_patterns)
+
+
+def template_names(engine):
+    """Names of templates under directories listed in DIRS of template engine"""
+    for directory in engine.dirs:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                yield os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/')
+
+
+def compile_templates():
+    """Parse every project template, cached loaders keep them compiled for the life of process"""
+    count = 0
+    for engine in engines.all():
+        for name in template_names(engine):
+            engine.get_template(name)
+            count += 1
+    return count
+
+
+def open_connections():
+    """Connect to every database, connections belong to thread running warm-up"""
+    for connection in connections.all():
+        connection.ensure_connection()
+    return len(connections.all())
+
+
+PHASES = (('urls', populate_urls), ('templates', compile_templates), ('database', open_connections))
+
+
+def warm_up():
+    """Run warm-up phases, return and keep their durations in milliseconds and number of items each one prepared"""
+    timings.clear()
+    counts = {}
+    for name, phase in PHASES:
+        start = time.perf_counter()
+        counts[name] = phase()
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    timings['total'] = round(sum(timings.values()), 1)
+    logger.info('Warmed up in %.1f ms: %s', timings['total'],
+                ', '.join('%s %.1f ms' % (name, timings[name]) for name, _ in PHASES))
+    return dict(timings), counts
@@ -33,4 +33,60 @@ function del(url, id = null) {
             console.log(data)
         }
     });
-}
\ No newline at end of file
+}
+function bulkDelete(url, checkboxes) {
+    const selected = $(checkboxes).filter(':checked');
+    const ids = selected.map(function () {
+        return parseInt(this.value)
+    }).get();
+    if (ids.length === 0) {
+        return
+    }
+    $.ajax({
+        url: url,
+        type: 'POST',
+        contentType: 'application/json',
+        data: JSON.stringify({ids: ids, action: 'delete'}),
+        success: function (data) {
+            selected.each(function () {
+                if (data.updated.includes(parseInt(this.value))) {
+                    $($(this).data('target')).remove()
+                }
+            });
+            console.log(data)
+        },
+        error: function (data) {
+            console.log(data)
+        }
+    });
+}
+const loadMoreObserver = new IntersectionObserver(function (entries) {
+    entries.forEach(function (entry) {
+        if (entry.isIntersecting) {
+            loadMore(entry.target)
+        }
+    });
+}, {rootMargin: '200px'});
+
+function observeLoadMore() {
+    $('.load-more').each(function () {
+        loadMoreObserver.observe(this)
+    });
+}
+
+function loadMore(sentinel) {
+    loadMoreObserver.unobserve(sentinel);
+    $.ajax({
+        url: $(sentinel).data('url'),
+        type: 'GET',
+        success: function (data) {
+            $(sentinel).replaceWith(data);
+            observeLoadMore()
+        },
+        error: function (data) {
+            loadMoreObserver.observe(sentinel);
+            console.log(data)
+        }
+    });
+}
+$(document).ready(observeLoadMore);
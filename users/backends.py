@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from ProgrammingWorkshop.signals import rows_updated
+from users.models import User
+
+
+def get_cache():
+    return caches[getattr(settings, 'USER_CACHE', 'default')]
+
+
+def user_key(pk):
+    return 'auth-user:%s' % pk
+
+
+class CachedModelBackend(ModelBackend):
+    """Authentication backend loading user of session together with role from cache
+
+    Cached user is dropped whenever account is saved or updated in bulk, so password and role changes apply on
+    next request.
+    """
+
+    def get_user(self, user_id):
+        cache = get_cache()
+        key = user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, getattr(settings, 'USER_CACHE_TIMEOUT', 300))
+        return user if self.user_can_authenticate(user) else None
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    get_cache().delete(user_key(instance.pk))
+
+
+@receiver(rows_updated, sender=User)
+def users_updated(sender, pks, **kwargs):
+    get_cache().delete_many([user_key(pk) for pk in pks])
@@ -1,8 +1,8 @@
 from django.contrib.auth import authenticate
 from django.core.exceptions import ValidationError
-from django.forms import TextInput, PasswordInput, ModelForm, Form, DateInput, CharField
+from django.forms import TextInput, PasswordInput, ModelForm, Form, DateInput, CharField, ChoiceField, TypedChoiceField
 
-from users.models import User
+from users.models import User, roles
 
 
 class UserForm(ModelForm):
@@ -41,3 +41,16 @@ class LoginForm(Form):
                 raise ValidationError('This account has been deleted.')
             cleaned_data['user'] = user
         return cleaned_data
+
+
+class UserSearchForm(Form):
+    """Form filtering and sorting user directory"""
+    SORTS = ('id', '-id', 'login', '-login', 'surname', '-surname')
+    login = CharField(required=False, max_length=30, widget=TextInput(attrs={'placeholder': 'Login starts with'}))
+    surname = CharField(required=False, max_length=30, widget=TextInput(attrs={'placeholder': 'Surname starts with'}))
+    role = TypedChoiceField(required=False, coerce=int, empty_value=None)
+    sort = ChoiceField(required=False, choices=[(sort, sort) for sort in SORTS])
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['role'].choices = [('', 'Any role')] + [(role.pk, role.role_name) for role in roles.all()]
@@ -0,0 +1,17 @@
+# Generated by Django 3.1.14 on 2026-10-17 15:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_is_deleted'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['id'], name='users_user_live_idx'),
+        ),
+    ]
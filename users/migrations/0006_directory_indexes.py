@@ -0,0 +1,41 @@
+# Generated by Django 3.1.14 on 2026-10-17 15:53
+
+from django.db import migrations, models
+
+# Indexes with NOCASE collation serve case insensitive prefix searches (LIKE) and sorting of user directory, with and
+# without role filter. Django can not declare them on model, migrations rebuilding users_user table on SQLite have to
+# create them again.
+NOCASE_INDEXES = {
+    'users_user_login_nocase_idx': 'login COLLATE NOCASE, id',
+    'users_user_surname_nocase_idx': 'surname COLLATE NOCASE, id',
+    'users_user_role_login_nocase_idx': 'role_id_id, login COLLATE NOCASE, id',
+    'users_user_role_surname_nocase_idx': 'role_id_id, surname COLLATE NOCASE, id',
+}
+NOCASE_INDEX_SQL = [
+    'CREATE INDEX IF NOT EXISTS %s ON users_user (%s) WHERE NOT is_deleted' % index for index in NOCASE_INDEXES.items()
+]
+DROP_NOCASE_INDEX_SQL = ['DROP INDEX IF EXISTS %s' % name for name in NOCASE_INDEXES]
+
+
+def run_sqlite(statements):
+    """Execute statements only on SQLite, other databases sort with LOWER() without these indexes"""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(is_deleted=False), fields=['role_id', 'id'], name='users_user_role_live_idx'),
+        ),
+        migrations.RunPython(run_sqlite(NOCASE_INDEX_SQL), run_sqlite(DROP_NOCASE_INDEX_SQL)),
+    ]
@@ -1,5 +1,10 @@
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.db import models
+from django.db.models import F, Func, Q
+
+from ProgrammingWorkshop.cache import ReferenceCache
+from ProgrammingWorkshop.managers import SoftDeleteQuerySet, LiveManager
+from ProgrammingWorkshop.tracking import LoadedValuesMixin
 
 
 class Role(models.Model):
@@ -10,7 +15,57 @@ class Role(models.Model):
         return self.role_name
 
 
-class User(AbstractBaseUser):
+roles = ReferenceCache(Role)
+
+
+class NoCase(Func):
+    """Compare and sort expression ignoring case, on SQLite with NOCASE collation which indexes can be built with"""
+    template = 'LOWER(%(expressions)s)'
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='%(expressions)s COLLATE NOCASE', **extra_context)
+
+
+class UserQuerySet(SoftDeleteQuerySet):
+    """Query set of users"""
+
+    def search(self, login=None, surname=None, role=None):
+        """Filter users by case insensitive login and surname prefixes and by role id"""
+        users = self
+        if login:
+            users = users.filter(login__istartswith=login)
+        if surname:
+            users = users.filter(surname__istartswith=surname)
+        if role:
+            users = users.filter(role_id=role)
+        return users
+
+    def with_sort_key(self, field):
+        """Annotate users with sort_key ordering them by field ignoring case, login and surname have matching indexes"""
+        return self.annotate(sort_key=NoCase(F(field)))
+
+    def editable_by(self, user):
+        """Users whose accounts can be deleted by user: anyone for admin, regular users for moderator and self"""
+        if user.admin:
+            return self
+        allowed = Q(pk=user.pk)
+        if user.moderator:
+            allowed |= ~Q(role_id__role_name__in=('admin', 'moderator'))
+        return self.filter(allowed)
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    """Manager loading role together with user, role is checked on every page"""
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('role_id')
+
+
+class LiveUserManager(LiveManager, UserManager):
+    """Manager returning users whose accounts are not deleted"""
+
+
+class User(LoadedValuesMixin, AbstractBaseUser):
     """Database model for users"""
     login = models.CharField(max_length=30, unique=True)
     name = models.CharField(max_length=20)
@@ -18,16 +73,31 @@ class User(AbstractBaseUser):
     date_of_birth = models.DateField()
     role_id = models.ForeignKey(Role, on_delete=models.SET_NULL, null=True)
     is_deleted = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
-    objects = BaseUserManager()
+    objects = UserManager()
+    live = LiveUserManager()
 
     REQUIRED_FIELDS = ['name', 'surname', 'date_of_birth', 'role_id']
     USERNAME_FIELD = 'login'
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=Q(is_deleted=False), name='users_user_live_idx'),
+            models.Index(fields=['updated_at'], condition=Q(is_deleted=True), name='users_user_deleted_idx'),
+            models.Index(fields=['role_id', 'id'], condition=Q(is_deleted=False), name='users_user_role_live_idx'),
+        ]
+
+    @property
+    def role_name(self):
+        """Name of user role read from cached roles"""
+        role = roles.get(self.role_id_id)
+        return role.role_name if role else None
+
     @property
     def admin(self):
-        return self.role_id.role_name == 'admin'
+        return self.role_name == 'admin'
 
     @property
     def moderator(self):
-        return self.role_id.role_name == 'moderator' or self.admin
+        return self.role_name == 'moderator' or self.admin
@@ -1,7 +1,14 @@
-from django.test import TestCase
+import json
+
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
 
-from users.models import User
+from ProgrammingWorkshop.testing import QueryBudgetTestMixin
+from users.models import User, Role, roles
 
 
 class AddUserTest(TestCase):
@@ -16,3 +23,215 @@ class AddUserTest(TestCase):
         self.assertAlmostEqual(User.objects.get(login='SamPanDonte').name, user.name)
         self.assertIsNot(user.password, 'TestPassword')
         self.assertIsInstance(user, User)
+
+
+class SignInTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for pk, name in ((1, 'admin'), (2, 'moderator'), (3, 'regular user')):
+            Role.objects.create(id=pk, role_name=name)
+
+    def register(self, login):
+        return self.client.post(reverse('users:register'), {
+            'login': login, 'password': 'Secret123', 'name': 'Name', 'surname': 'Surname',
+            'date_of_birth': '2000-01-01',
+        })
+
+    def test_sign_up_as_regular_user(self):
+        self.assertRedirects(self.register('newcomer'), reverse('CRM:index'), fetch_redirect_response=False)
+        self.assertEqual(User.objects.get(login='newcomer').role_id.role_name, 'regular user')
+
+    def test_deleted_account_can_not_sign_in(self):
+        self.register('leaver')
+        self.client.logout()
+        User.objects.filter(login='leaver').soft_delete()
+        response = self.client.post(reverse('users:login'), {'login': 'leaver', 'password': 'Secret123'})
+        self.assertContains(response, 'This account has been deleted.')
+        response = self.client.post(reverse('users:login'), {'login': 'leaver', 'password': 'wrong'})
+        self.assertContains(response, 'Login or password not correct.')
+
+
+class UserListTest(QueryBudgetTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = Role.objects.create(role_name='moderator')
+        cls.moderator = User.objects.create(login='moderator', name='Mod', surname='Erator',
+                                            date_of_birth='2000-01-01', role_id=cls.role)
+
+    def setUp(self):
+        self.client.force_login(self.moderator)
+
+    def add_users(self):
+        start = User.objects.count()
+        for i in range(start, start + 3):
+            User.objects.create(login='user%d' % i, name='Name', surname='Surname', date_of_birth='2000-01-01',
+                                role_id=Role.objects.create(role_name='role %d' % i))
+
+    def test_user_list_queries(self):
+        self.assertQueryCountConstant([reverse('users:index')], self.add_users)
+        self.assertWithinQueryBudget(reverse('users:index'))
+        self.assertQueryCountConstant([reverse('users:index') + '?surname=sur&sort=-surname&after=1:Surname'],
+                                      self.add_users)
+
+
+class UserDirectoryTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = Role.objects.create(role_name='moderator')
+        cls.other_role = Role.objects.create(role_name='regular user')
+        cls.moderator = User.objects.create(login='moderator', name='Mod', surname='Erator',
+                                            date_of_birth='2000-01-01', role_id=cls.role)
+        for i, surname in enumerate(('nowak', 'Nowacki', 'NOWAK', 'Kowalski', 'nowicka') * 5):
+            User.objects.create(login='user%02d' % i, name='Name', surname=surname, date_of_birth='2000-01-01',
+                                role_id=cls.other_role, is_deleted=i == 0)
+
+    def setUp(self):
+        self.client.force_login(self.moderator)
+
+    def pages(self, query):
+        """Follow next page links and return logins of every page"""
+        pages = []
+        while query is not None:
+            page = self.client.get(reverse('users:index') + '?' + query).context['user_list']
+            pages.append([user.login for user in page])
+            query = page.next_query() if page.has_next() else None
+        return pages
+
+    def test_search_by_prefix_and_role_sorted_ignoring_case(self):
+        pages = self.pages('surname=NOWA&role=%d&sort=surname' % self.other_role.pk)
+        logins = sum(pages, [])
+        self.assertEqual([len(page) for page in pages], [10, 4])
+        surnames = [User.objects.get(login=login).surname for login in logins]
+        self.assertEqual([surname.lower() for surname in surnames], ['nowacki'] * 5 + ['nowak'] * 9)
+        self.assertEqual(logins[5:], sorted(logins[5:], key=lambda login: int(login[4:])))
+        self.assertNotIn('user00', logins)
+        self.assertEqual(sum(self.pages('login=USER1&sort=-login'), []), ['user%d' % i for i in range(19, 9, -1)])
+        self.assertEqual(self.pages('role=%d' % self.role.pk), [['moderator']])
+
+    def test_previous_page_and_sort_links(self):
+        response = self.client.get(reverse('users:index') + '?sort=surname')
+        self.assertEqual(response.context['sort_queries']['surname'], 'sort=-surname')
+        second = self.client.get(reverse('users:index') + '?' + response.context['user_list'].next_query())
+        previous = self.client.get(reverse('users:index') + '?' + second.context['user_list'].previous_query())
+        self.assertEqual(list(previous.context['user_list']), list(response.context['user_list']))
+        self.assertFalse(previous.context['user_list'].has_previous())
+
+    def test_prefix_search_sorted_by_searched_column_by_default(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('users:index') + '?surname=now')
+        surnames = [user.surname.lower() for user in response.context['user_list']]
+        self.assertEqual(surnames, sorted(surnames))
+        sql = next(query['sql'] for query in context.captured_queries if 'COLLATE NOCASE' in query['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('users_user_surname_nocase_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_prefix_search_uses_nocase_index(self):
+        users = User.live.search(surname='now').with_sort_key('surname').order_by('sort_key', 'pk')
+        with connection.cursor() as cursor:
+            sql, params = users.query.sql_with_params()
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('users_user_surname_nocase_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class BulkUserTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        roles = {name: Role.objects.create(role_name=name) for name in ('admin', 'moderator', 'regular user')}
+        cls.users = {
+            name: User.objects.create(login=name, name='Name', surname='Surname', date_of_birth='2000-01-01',
+                                      role_id=role)
+            for name, role in roles.items()
+        }
+        cls.other = User.objects.create(login='other', name='Name', surname='Surname', date_of_birth='2000-01-01',
+                                        role_id=roles['regular user'])
+        cls.roles = roles
+
+    def post(self, user, data):
+        self.client.force_login(self.users[user])
+        return self.client.post(reverse('users:bulk'), json.dumps(data), content_type='application/json')
+
+    def test_moderator_deletes_only_regular_users(self):
+        ids = [user.id for user in self.users.values()] + [self.other.id]
+        response = self.post('moderator', {'ids': ids, 'action': 'delete'})
+        self.assertEqual(response.json()['updated'], [self.users['moderator'].id, self.users['regular user'].id,
+                                                      self.other.id])
+        self.assertFalse(User.objects.get(login='admin').is_deleted)
+
+    def test_regular_user_deletes_only_self(self):
+        response = self.post('regular user', {'ids': [self.other.id], 'action': 'delete'})
+        self.assertEqual(response.json()['updated'], [])
+        self.assertFalse(User.objects.get(pk=self.other.id).is_deleted)
+
+    def test_only_admin_changes_roles(self):
+        data = {'ids': [self.other.id], 'values': {'role_id': self.roles['moderator'].id}}
+        self.assertEqual(self.post('moderator', data).status_code, 400)
+        self.assertEqual(self.post('admin', data).status_code, 200)
+        self.assertTrue(User.objects.get(pk=self.other.id).moderator)
+
+    def test_single_delete_keeps_permissions(self):
+        self.client.force_login(self.users['moderator'])
+        self.assertEqual(self.client.delete(reverse('users:detail', args=[self.users['admin'].id])).status_code, 403)
+        self.assertEqual(self.client.delete(reverse('users:detail', args=[self.other.id])).status_code, 200)
+        self.assertTrue(User.objects.get(pk=self.other.id).is_deleted)
+
+
+class RoleCacheTest(TestCase):
+
+    def test_role_checks_without_queries(self):
+        role = Role.objects.create(role_name='moderator')
+        user = User.objects.create(login='moderator', name='Name', surname='Surname', date_of_birth='2000-01-01',
+                                   role_id=role)
+        user = User._base_manager.get(pk=user.pk)
+        roles.get(role.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.moderator)
+            self.assertFalse(user.admin)
+
+
+class CachedAuthenticationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = Role.objects.create(role_name='regular user')
+        cls.user = User.objects.create(login='tester', name='Test', surname='User', date_of_birth='2000-01-01',
+                                       role_id=cls.role)
+        cls.user.set_password('Secret123')
+        cls.user.save()
+
+    def setUp(self):
+        self.client.post(reverse('users:login'), {'login': 'tester', 'password': 'Secret123'})
+
+    def test_session_and_user_loaded_without_queries(self):
+        self.client.get(reverse('users:password'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('users:password')).status_code, 200)
+
+    @override_settings(SESSION_CACHE_TIMEOUT=0)
+    def test_session_deleted_in_database_ends_once_cached_copy_expires(self):
+        self.client.logout()
+        self.client.post(reverse('users:login'), {'login': 'tester', 'password': 'Secret123'})
+        self.assertEqual(self.client.get(reverse('users:detail')).status_code, 200)
+        Session.objects.all().delete()
+        self.assertEqual(self.client.get(reverse('users:detail')).status_code, 302)
+
+    def test_account_changes_invalidate_cached_user(self):
+        self.client.get(reverse('users:detail'))
+        self.client.post(reverse('users:detail'), {'login': 'renamed', 'name': 'Test', 'surname': 'User',
+                                                   'date_of_birth': '2000-01-01'})
+        self.assertEqual(self.client.get(reverse('users:detail')).context['user'].login, 'renamed')
+        self.client.post(reverse('users:password'), {'old_password': 'Secret123', 'new_password1': 'Changed456!',
+                                                     'new_password2': 'Changed456!'})
+        self.assertEqual(self.client.get(reverse('users:detail')).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(password='')
+        self.assertEqual(self.client.get(reverse('users:detail')).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update_rows(password='')
+        self.assertEqual(self.client.get(reverse('users:detail')).status_code, 302)
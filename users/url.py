@@ -10,6 +10,7 @@ urlpatterns = [
     path('login/', views.SignInView.as_view(), name='login'),
     path('register/', views.SignUpView.as_view(), name='register'),
     path('logout/', views.sign_out, name='logout'),
+    path('admin/bulk', views.BulkUserView.as_view(), name='bulk'),
     path('detail/', views.DetailView.as_view(), name='detail'),
     path('detail/<int:user_id>', views.DetailView.as_view(), name='detail'),
     path('password/', views.PasswordChangeView.as_view(), name='password')
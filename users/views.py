@@ -1,15 +1,16 @@
 from django.contrib.auth import login, logout
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.core.paginator import Paginator
 from django.forms import modelform_factory
 from django.http import HttpResponseRedirect, HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 from django.urls import reverse
 from django.views import View
 
-from users.forms import LoginForm, UserForm
-from users.models import User, Role
+from ProgrammingWorkshop.pagination import KeysetPaginator
+from ProgrammingWorkshop.views import BulkUpdateView
+from users.forms import LoginForm, UserForm, UserSearchForm
+from users.models import User, roles
 
 
 class IndexView(LoginRequiredMixin, UserPassesTestMixin, View):
@@ -17,12 +18,45 @@ class IndexView(LoginRequiredMixin, UserPassesTestMixin, View):
     login_url = 'users:login'
     redirect_field_name = 'redirect'
     template = 'users/index.html'
+    query_budget = 5
+    read_only = True
 
     def get(self, request, page_num=1):
-        """Render administration page"""
-        user_pages = Paginator(User.objects.filter(is_deleted=False).order_by('id'), 10)
-        user_list = user_pages.get_page(page_num)
-        return render(request, self.template, {'user_list': user_list})
+        """Render administration page with users matching search, sorted by chosen column"""
+        form = UserSearchForm(request.GET)
+        form.is_valid()
+        search = form.cleaned_data
+        sort = search.get('sort') or self.default_sort(search)
+        field = sort.lstrip('-')
+        users = User.live.search(search.get('login'), search.get('surname'), search.get('role'))
+        sort_key = None
+        if field != 'id':
+            users = users.with_sort_key(field)
+            sort_key = 'sort_key'
+        user_pages = KeysetPaginator(users, 10, newest_first=sort.startswith('-'), sort_key=sort_key)
+        user_list = user_pages.get_page(request.GET.get('after'), request.GET.get('before'), request.GET)
+        return render(request, self.template, {'user_list': user_list, 'form': form,
+                                               'sort_queries': self.sort_queries(request, sort)})
+
+    @staticmethod
+    def default_sort(search):
+        """Prefix searches are sorted by searched column, NOCASE index then gives both range and order"""
+        for field in ('login', 'surname'):
+            if search.get(field):
+                return field
+        return 'id'
+
+    @staticmethod
+    def sort_queries(request, sort):
+        """Query strings sorting by each column, column already sorted by is reversed, paging starts over"""
+        queries = {}
+        for field in ('id', 'login', 'surname'):
+            params = request.GET.copy()
+            for key in ('after', 'before'):
+                params.pop(key, None)
+            params['sort'] = '-' + field if sort == field else field
+            queries[field] = params.urlencode()
+        return queries
 
     def test_func(self):
         """Check if user is moderator"""
@@ -70,7 +104,7 @@ class SignUpView(UserPassesTestMixin, View):
         if form.is_valid():
             user = form.save(commit=False)
             user.set_password(form.cleaned_data['password'])
-            user.role_id = Role.objects.get(pk=3)
+            user.role_id = roles.get(3)
             user.save()
             login(request, user)
             return HttpResponseRedirect(reverse('CRM:index'))
@@ -123,16 +157,29 @@ class DetailView(LoginRequiredMixin, View):
 
     @staticmethod
     def delete(request, user_id):
-        user = User.objects.get(pk=user_id)
-        if request.user.admin or request.user == user or (request.user.moderator and not user.moderator):
-            user.is_deleted = True
-            user.save()
-            if request.user == user:
+        if User.objects.editable_by(request.user).filter(pk=user_id).soft_delete():
+            if request.user.pk == user_id:
                 logout(request)
             return HttpResponse('{"status": "Success"}', status=200)
         return HttpResponseForbidden('{"status": "Forbidden"}')
 
 
+class BulkUserView(BulkUpdateView):
+    """View deleting many users or changing their role, with permissions of single account delete"""
+    model = User
+    form = UserForm
+
+    def get_queryset(self, request):
+        return User.live.editable_by(request.user)
+
+    def get_fields(self, request):
+        return ('role_id',) if request.user.admin else ()
+
+    def updated(self, request, pks):
+        if request.user.pk in pks:
+            logout(request)
+
+
 class PasswordChangeView(LoginRequiredMixin, View):
     """View for password change"""
     login_url = 'users:login'